@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测量各入口模块的启动耗时和常驻内存
+
+每个模块在全新的解释器中导入若干次，记录导入耗时、进程最大常驻内存（RSS），
+以及是否带入了pandas等导入侧的重量级依赖。
+
+用法: python benchmarks/bench_startup.py [--repeat N] [模块名 ...]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = ['search_web', 'book_search', 'ingest']
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl']
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(module: str, repeat: int) -> dict:
+    """在独立进程中多次导入模块，返回耗时和内存的中位数"""
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {
+        'module': module,
+        'seconds': statistics.median(s['seconds'] for s in samples),
+        'max_rss_mb': statistics.median(s['max_rss_kb'] for s in samples) / 1024,
+        'heavy': samples[-1]['heavy'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量模块启动耗时和内存占用')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='要测量的模块')
+    parser.add_argument('--repeat', type=int, default=5, help='每个模块的测量次数')
+    args = parser.parse_args()
+
+    print(f"{'模块':<16}{'导入耗时(秒)':>14}{'最大RSS(MB)':>14}  重量级依赖")
+    for module in args.modules:
+        try:
+            result = measure(module, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<16}导入失败: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{result['module']:<16}{result['seconds']:>14.3f}{result['max_rss_mb']:>14.1f}  "
+              f"{', '.join(result['heavy']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""流式导出搜索结果到CSV/XLSX，逐块写出而不在内存中保留全部结果"""
+
+import csv
+import io
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, Dict, Any, Optional
+
+from book_search import BOOK_COLUMNS
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# CSV每累计多少行向外输出一次
+CSV_FLUSH_ROWS = 1000
+
+
+def guess_format(path: str, default: str = 'xlsx') -> str:
+    """根据文件扩展名推断导出格式"""
+    suffix = Path(path).suffix.lower().lstrip('.')
+    if suffix in EXPORT_FORMATS:
+        return suffix
+    return default
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], columns=BOOK_COLUMNS) -> Iterator[str]:
+    """将结果逐块编码为CSV文本，可直接用于HTTP流式响应"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 写入BOM，保证Excel打开中文内容时不乱码
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+
+    pending = 0
+    for row in rows:
+        writer.writerow([row.get(column) for column in columns])
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    yield buffer.getvalue()
+
+
+def write_csv(rows: Iterable[Dict[str, Any]], path: str, columns=BOOK_COLUMNS) -> int:
+    """以流式方式写出CSV文件，返回导出的行数"""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in iter_csv(counted(), columns):
+            f.write(chunk)
+    return count
+
+
+def write_xlsx(rows: Iterable[Dict[str, Any]], path: str, columns=BOOK_COLUMNS) -> int:
+    """使用openpyxl的只写模式逐行写出XLSX文件，返回导出的行数"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('books')
+    sheet.append(columns)
+
+    count = 0
+    for row in rows:
+        sheet.append([row.get(column) for column in columns])
+        count += 1
+
+    workbook.save(path)
+    return count
+
+
+def export_books(rows: Iterable[Dict[str, Any]], path: str, fmt: Optional[str] = None) -> int:
+    """导出结果到指定文件，格式未指定时按扩展名推断"""
+    fmt = (fmt or guess_format(path)).lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+    if fmt == 'csv':
+        count = write_csv(rows, path)
+    else:
+        count = write_xlsx(rows, path)
+
+    logging.info(f"已导出 {count} 条记录到 {path}")
+    return count
@@ -1,39 +1,257 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+"""图书查询
+
+本模块只包含查询路径所需的依赖；导入相关的pandas等重量级依赖位于ingest模块，
+仅在加载数据时才会导入，使Web服务进程启动快、占用内存少。
+"""
 
-import pandas as pd
-import numpy as np
 import argparse
 import logging
 import sys
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 from datetime import datetime
 import re
-import multiprocessing as mp
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-import os
-import warnings
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import traceback
-from threading import Lock
-from apscheduler.schedulers.background import BackgroundScheduler
 import mysql.connector
 from mysql.connector import Error
-import hashlib
-import time
+from suggest import lookup_suggestions, rebuild_suggest_terms
 
-# 设置警告过滤
-warnings.filterwarnings('ignore')
+def setup_logging():
+    """配置命令行工具的日志输出（控制台和日志文件）"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler('book_search.log', encoding='utf-8')
+        ]
+    )
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('book_search.log', encoding='utf-8')
-    ]
+# 查询结果返回的列（同时作为导出文件的表头）
+BOOK_COLUMNS = [
+    'id', 'file_id', 'title', 'author', 'publisher',
+    'language', 'publish_year', 'format', 'source_file'
+]
+
+# 批量查询的相关限制
+BATCH_INSERT_SIZE = 5000    # 每次写入临时表的行数
+TITLE_LOOKUP_WORKERS = 8    # 书名全文检索的并发连接数上限
+TITLE_MATCH_LIMIT = 20      # 每个书名最多返回的匹配数
+FILE_ID_MAX_LENGTH = 100    # books.file_id列的长度
+FULLTEXT_MIN_TOKEN = 3      # InnoDB全文索引的最短词长（innodb_ft_min_token_size默认值）
+# InnoDB全文索引的默认停用词（INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD），不会被索引
+FULLTEXT_STOPWORDS = frozenset(
+    'a about an are as at be by com de en for from how i in is it la '
+    'of on or that the this to was what when where who will with und www'.split()
 )
+# 布尔模式全文检索中的运算符
+FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+def parse_lookup_values(lines) -> List[str]:
+    """清洗批量查询的输入：去除首尾空白和空行，保持顺序去重"""
+    values = []
+    seen = set()
+    for line in lines:
+        value = str(line).strip()
+        if value and value not in seen:
+            seen.add(value)
+            values.append(value)
+    return values
+
+def title_match_query(title: str) -> str:
+    """将书名转换为布尔模式的全文检索条件：要求书名中的每个词都出现
+
+    短于索引最短词长的词和停用词不会被索引，不作要求；没有可用的词时按整句短语匹配。
+    """
+    words = [
+        w for w in FULLTEXT_OPERATORS.sub(' ', title).split()
+        if len(w) >= FULLTEXT_MIN_TOKEN and w.lower() not in FULLTEXT_STOPWORDS
+    ]
+    if words:
+        return ' '.join(f'+{w}' for w in words)
+    return '"' + FULLTEXT_OPERATORS.sub(' ', title).strip() + '"'
+
+# books表中实际存储的列：语种、文件格式、源文件以字典表编号保存
+STORED_COLUMNS = [
+    'id', 'file_id', 'title', 'author', 'publisher',
+    'language_id', 'publish_year', 'format_id', 'source_file_id'
+]
+# 全文检索的文本列
+TEXT_COLUMNS = ('title', 'author', 'publisher')
+# 编号列 -> (字典表, 对外的列名)
+DICTIONARY_COLUMNS = {
+    'language_id': ('languages', 'language'),
+    'format_id': ('formats', 'format'),
+    'source_file_id': ('source_files', 'source_file'),
+}
+# 字典缓存遇到未知名称时，两次重新加载之间的最小间隔（秒）
+LOOKUP_REFRESH_INTERVAL = 30
+# 两次检查数据集版本（以确认表结构布局）之间的最小间隔（秒）
+LAYOUT_CHECK_INTERVAL = 5
+
+# MySQL错误码：超过MAX_EXECUTION_TIME / 被KILL QUERY中断
+ER_QUERY_TIMEOUT = 3024
+ER_QUERY_INTERRUPTED = 1317
+# 服务端时限未生效时，看门狗在时限之后再等待的秒数
+WATCHDOG_GRACE = 2
+QUERY_ID_PATTERN = re.compile(r'[A-Za-z0-9-]{1,64}\Z')
+
+class QueryTimeoutError(Exception):
+    """查询超过时限（通常是搜索条件过于宽泛）"""
+
+class QueryCancelledError(Exception):
+    """查询被客户端取消"""
+
+class _QueryWatchdog:
+    """查询超过时限仍未结束时，通过独立连接执行KILL QUERY"""
+
+    def __init__(self, db_config: dict, connection_id: int, timeout: float):
+        self.db_config = db_config
+        self.connection_id = connection_id
+        self.fired = False
+        self._timer = threading.Timer(timeout + WATCHDOG_GRACE, self._kill)
+        self._timer.daemon = True
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        self._timer.cancel()
+
+    def _kill(self):
+        self.fired = True
+        try:
+            conn = mysql.connector.connect(**self.db_config)
+            try:
+                conn.cursor().execute(f"KILL QUERY {int(self.connection_id)}")
+            finally:
+                conn.close()
+            logging.warning(f"查询超时，已终止连接 {self.connection_id} 上的查询")
+        except Error as e:
+            logging.error(f"终止超时查询时发生错误: {e}")
+
+class _LookupCache:
+    """进程内缓存的字典表（编号 <-> 名称），所有BookSearcher实例共享"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.names = {}         # 表 -> {编号: 名称}
+        self.ids = {}           # 表 -> {名称(忽略大小写): [编号, ...]}
+        self.loaded_at = None
+
+    def refresh(self, db_config: dict, force: bool = False) -> None:
+        """首次使用时加载；force为True时在间隔允许的情况下重新加载"""
+        with self.lock:
+            now = time.time()
+            if self.loaded_at is not None and (
+                    not force or now - self.loaded_at < LOOKUP_REFRESH_INTERVAL):
+                return
+
+            conn = mysql.connector.connect(**db_config)
+            cursor = conn.cursor()
+            try:
+                for table, _ in DICTIONARY_COLUMNS.values():
+                    cursor.execute(f"SELECT id, name FROM {table}")
+                    names = dict(cursor.fetchall())
+                    ids = {}
+                    for id_, name in names.items():
+                        ids.setdefault(name.casefold(), []).append(id_)
+                    self.names[table] = names
+                    self.ids[table] = ids
+            finally:
+                cursor.close()
+                conn.close()
+            self.loaded_at = now
+
+    def lookup_ids(self, db_config: dict, table: str, name: str) -> List[int]:
+        """返回与名称匹配（忽略大小写，与原VARCHAR列的比较方式一致）的编号"""
+        self.refresh(db_config)
+        key = str(name).strip().casefold()
+        if key not in self.ids[table]:
+            # 可能是加载之后新导入的取值
+            self.refresh(db_config, force=True)
+        return self.ids[table].get(key, [])
+
+    def lookup_name(self, db_config: dict, table: str, id_: int) -> Optional[str]:
+        self.refresh(db_config)
+        name = self.names[table].get(id_)
+        if name is None:
+            # 编号只增不减，未知编号一定是加载缓存之后新写入的，
+            # 直接查询该编号而不受重新加载间隔限制，避免结果中出现空值
+            name = self._fetch_name(db_config, table, id_)
+        return name
+
+    def _fetch_name(self, db_config: dict, table: str, id_: int) -> Optional[str]:
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT name FROM {table} WHERE id = %s", (id_,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+        if row is None:
+            return None
+
+        name = row[0]
+        with self.lock:
+            self.names[table][id_] = name
+            ids = self.ids[table].setdefault(name.casefold(), [])
+            if id_ not in ids:
+                ids.append(id_)
+        return name
+
+_lookups = _LookupCache()
+
+class _LayoutCache:
+    """进程内缓存的表结构布局（是否为分区布局），所有BookSearcher实例共享
+
+    load_xlsx.py可能以另一种布局重新建表，数据集版本变化时重新检测。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.partitioned = False
+        self.checked_at = 0.0
+
+    def is_partitioned(self, searcher: 'BookSearcher') -> bool:
+        with self.lock:
+            now = time.time()
+            if now - self.checked_at >= LAYOUT_CHECK_INTERVAL:
+                version = searcher.get_dataset_version()
+                if version != self.version:
+                    self.partitioned = self._detect(searcher.db_config)
+                    self.version = version
+                self.checked_at = now
+            return self.partitioned
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.version = None
+            self.checked_at = 0.0
+
+    @staticmethod
+    def _detect(db_config: dict) -> bool:
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM information_schema.tables
+                WHERE table_schema = DATABASE() AND table_name = 'book_texts'
+            """)
+            return cursor.fetchone()[0] > 0
+        finally:
+            cursor.close()
+            conn.close()
+
+_layout = _LayoutCache()
 
 class BookSearcher:
     """图书搜索器"""
@@ -47,6 +265,11 @@ class BookSearcher:
         }
         self.ensure_db_initialized()
 
+    @property
+    def partitioned(self) -> bool:
+        """是否使用分区布局（文本列位于book_texts表）"""
+        return _layout.is_partitioned(self)
+
     def ensure_db_initialized(self):
         """确保数据库已初始化"""
         try:
@@ -55,14 +278,35 @@ class BookSearcher:
             
             # 检查表是否存在
             cursor.execute("""
-                SELECT COUNT(*) 
+                SELECT table_name 
                 FROM information_schema.tables 
                 WHERE table_schema = %s 
-                AND table_name IN ('books', 'processed_files')
+                AND table_name IN ('books', 'processed_files', 'languages', 'formats', 'source_files')
             """, (self.db_config['database'],))
+            tables = {row[0] for row in cursor.fetchall()}
             
-            if cursor.fetchone()[0] < 2:
+            if 'books' not in tables:
                 self.init_database()
+                return
+
+            # 旧版books表以字符串保存语种等列，迁移耗时很长，由导入端单独执行
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'books'
+                AND COLUMN_NAME IN ('language', 'format', 'source_file')
+            """, (self.db_config['database'],))
+            if cursor.fetchone()[0] > 0:
+                message = "books表仍为旧版结构，请先运行 python load_xlsx.py --migrate 完成迁移"
+                logging.error(message)
+                raise RuntimeError(message)
+
+            missing = {'processed_files', 'languages', 'formats', 'source_files'} - tables
+            if missing:
+                # books表中已有数据，不能为补建缺失的表而重建全部表
+                message = f"数据库缺少表 {', '.join(sorted(missing))}，请检查数据库或使用load_xlsx.py重新导入"
+                logging.error(message)
+                raise RuntimeError(message)
             
         except Error as e:
             logging.error(f"检查数据库状态时发生错误: {e}")
@@ -72,47 +316,16 @@ class BookSearcher:
                 cursor.close()
                 conn.close()
 
-    def init_database(self):
-        """初始化数据库连接和表"""
+    def init_database(self, partitioned: bool = False):
+        """初始化数据库连接和表，partitioned为True时创建分区布局"""
         try:
             conn = mysql.connector.connect(**self.db_config)
             cursor = conn.cursor()
 
-            # 删除旧表（如果存在）
-            cursor.execute("DROP TABLE IF EXISTS books")
-            cursor.execute("DROP TABLE IF EXISTS processed_files")
-            
-            # 创建已处理文件记录表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS processed_files (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    file_path VARCHAR(512) NOT NULL,
-                    file_hash VARCHAR(64) NOT NULL,
-                    last_modified TIMESTAMP,
-                    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE KEY unique_file_hash (file_hash),
-                    UNIQUE KEY unique_file_path (file_path)
-                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
-            """)
-            
-            # 创建书籍信息表
-            cursor.execute("""
-                CREATE TABLE books (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    file_id VARCHAR(100),
-                    title MEDIUMTEXT,
-                    author MEDIUMTEXT,
-                    publisher MEDIUMTEXT,
-                    language VARCHAR(50),
-                    publish_year INT,
-                    format VARCHAR(50),
-                    source_file VARCHAR(512),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FULLTEXT INDEX idx_title (title),
-                    FULLTEXT INDEX idx_author (author),
-                    FULLTEXT INDEX idx_publisher (publisher)
-                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
-            """)
+            # 删除旧表并重新创建
+            from ingest import create_tables
+            create_tables(cursor, partitioned=partitioned)
+            _layout.invalidate()
 
             conn.commit()
             logging.info("数据库表初始化完成")
@@ -124,129 +337,6 @@ class BookSearcher:
                 cursor.close()
                 conn.close()
 
-    @staticmethod
-    def process_file_static(file_path: str, db_config: dict) -> tuple:
-        """静态方法处理单个文件并将数据存入数据库"""
-        try:
-            # 在子进程中创建新的数据库连接
-            conn = mysql.connector.connect(**db_config)
-            cursor = conn.cursor()
-
-            # 计算文件哈希值
-            hash_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            file_hash = hash_md5.hexdigest()
-
-            # 检查文件是否已处理
-            cursor.execute("""
-                SELECT file_path, file_hash, last_modified 
-                FROM processed_files 
-                WHERE file_path = %s OR file_hash = %s
-            """, (file_path, file_hash))
-            
-            result = cursor.fetchone()
-            if result:
-                db_path, db_hash, db_modified = result
-                current_modified = datetime.fromtimestamp(os.path.getmtime(file_path))
-                
-                # 如果文件路径和哈希值都匹配，且修改时间未变，则跳过
-                if db_path == file_path and db_hash == file_hash:
-                    logging.info(f"文件已处理过且未修改，跳过: {file_path}")
-                    return None
-                
-                # 如果只有哈希值匹配，说明是相同内容的文件
-                if db_hash == file_hash:
-                    logging.info(f"发现相同内容的文件: {db_path} 和 {file_path}")
-                    return None
-
-            # 优化Excel读取
-            df = pd.read_excel(
-                file_path,
-                dtype={
-                    '文件编号': str,
-                    '书名': str,
-                    '作者': str,
-                    '出版社': str,
-                    '语种': str,
-                    '出版年份': 'Int64',
-                    '文件格式': str
-                }
-            )
-            df['源文件'] = Path(file_path).name
-            
-            # 替换所有的NaN值为None
-            df = df.replace({np.nan: None})
-
-            # 分批处理数据，增加批量大小
-            batch_size = 5000  # 增加到5000条记录
-            total_rows = len(df)
-            processed_rows = 0
-            last_log_time = time.time()
-            log_interval = 5  # 每5秒记录一次日志
-
-            # 准备SQL语句
-            sql = """
-                INSERT INTO books (
-                    file_id, title, author, publisher, 
-                    language, publish_year, format, source_file
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-
-            while processed_rows < total_rows:
-                batch_df = df.iloc[processed_rows:processed_rows + batch_size]
-                values = []
-                
-                for _, row in batch_df.iterrows():
-                    values.append((
-                        str(row.get('文件编号'))[:100] if pd.notna(row.get('文件编号')) else None,
-                        str(row.get('书名')) if pd.notna(row.get('书名')) else None,
-                        str(row.get('作者')) if pd.notna(row.get('作者')) else None,
-                        str(row.get('出版社')) if pd.notna(row.get('出版社')) else None,
-                        str(row.get('语种'))[:50] if pd.notna(row.get('语种')) else None,
-                        int(row.get('出版年份')) if pd.notna(row.get('出版年份')) else None,
-                        str(row.get('文件格式'))[:50] if pd.notna(row.get('文件格式')) else None,
-                        str(row.get('源文件'))[:512] if pd.notna(row.get('源文件')) else None
-                    ))
-
-                try:
-                    # 使用executemany进行批量插入
-                    cursor.executemany(sql, values)
-                    conn.commit()
-                    
-                    processed_rows += len(batch_df)
-                    
-                    # 控制日志输出频率
-                    current_time = time.time()
-                    if current_time - last_log_time >= log_interval:
-                        logging.info(f"文件 {Path(file_path).name}: 已处理 {processed_rows}/{total_rows} 行 ({processed_rows/total_rows*100:.1f}%)")
-                        last_log_time = current_time
-                        
-                except Error as e:
-                    logging.error(f"插入批次数据时发生错误: {str(e)}")
-                    conn.rollback()
-                    raise
-
-            # 记录已处理文件
-            cursor.execute("""
-                INSERT INTO processed_files (file_path, file_hash, last_modified)
-                VALUES (%s, %s, %s)
-            """, (file_path, file_hash, datetime.fromtimestamp(os.path.getmtime(file_path))))
-
-            conn.commit()
-            logging.info(f"完成处理文件 {Path(file_path).name}: 共处理 {total_rows} 行")
-            return str(file_path), True
-        except Exception as e:
-            logging.error(f"处理文件时发生错误 {file_path}: {str(e)}")
-            if 'conn' in locals() and conn.is_connected():
-                conn.rollback()
-            return None
-        finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
-
     def load_data(self, directory: str = '../xlsx', force_reload: bool = False) -> None:
         """仅在必要时加载Excel文件数据"""
         try:
@@ -254,10 +344,15 @@ class BookSearcher:
             conn = mysql.connector.connect(**self.db_config)
             cursor = conn.cursor()
             
+            # 导入相关依赖只在加载数据时才导入
+            from ingest import IngestEngine, has_pending_checkpoints
+
+            # 上次导入中断时从检查点继续，否则已有数据则跳过
+            resuming = has_pending_checkpoints(conn)
+
             cursor.execute("SELECT COUNT(*) FROM books")
             book_count = cursor.fetchone()[0]
-            
-            if book_count > 0 and not force_reload:
+            if book_count > 0 and not force_reload and not resuming:
                 logging.info(f"数据库中已有 {book_count} 条记录，跳过加载")
                 return
             
@@ -273,34 +368,17 @@ class BookSearcher:
             
             print(f"找到 {len(excel_files)} 个Excel文件，开始加载...")
             
-            # 使用进程池处理文件
-            with ProcessPoolExecutor(max_workers=min(42, mp.cpu_count())) as executor:
-                futures = []
-                for file_path in excel_files:
-                    futures.append(
-                        executor.submit(
-                            self.process_file_static,
-                            str(file_path),
-                            self.db_config
-                        )
-                    )
-                
-                # 显示进度
-                total_files = len(futures)
-                completed = 0
-                
-                for future in futures:
-                    try:
-                        result = future.result()
-                        if result:
-                            completed += 1
-                        print(f"加载进度: {completed}/{total_files} 文件 ({(completed/total_files*100):.1f}%)", 
-                              end='\r')
-                    except Exception as e:
-                        logging.error(f"处理加载结果时发生错误: {str(e)}")
-                        logging.error(traceback.format_exc())
+            # 解析进程与写入线程组成流水线导入
+            def show_progress(completed, total_files):
+                print(f"加载进度: {completed}/{total_files} 文件 ({(completed/total_files*100):.1f}%)", 
+                      end='\r')
+
+            IngestEngine(self.db_config).run(excel_files, progress=show_progress)
         
             print("\n数据加载完成！")
+
+            # 数据变化后重建联想索引
+            rebuild_suggest_terms(self.db_config)
         except Error as e:
             logging.error(f"检查数据库状态时发生错误: {e}")
             raise
@@ -338,73 +416,144 @@ class BookSearcher:
             logging.error(f"处理数据块时发生错误: {str(e)}")
             return []
 
-    def search_books(self, **kwargs) -> List[Dict[str, Any]]:
-        """从数据库中搜索符合条件的书籍"""
+    def _append_lookup_condition(self, conditions: list, params: list, column: str, value: str) -> None:
+        """将按名称过滤转换为按字典编号过滤"""
+        ids = _lookups.lookup_ids(self.db_config, DICTIONARY_COLUMNS[column][0], value)
+        if not ids:
+            # 字典中不存在该取值，不可能有匹配
+            conditions.append("0")
+            return
+        conditions.append(f"b.{column} IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
+
+    def _text_column(self, column: str) -> str:
+        """文本列的完整列名：分区布局下位于book_texts表"""
+        return f"{'t' if self.partitioned else 'b'}.{column}"
+
+    def _from_clause(self, with_texts: bool = True) -> str:
+        """FROM子句，books表别名为b；分区布局下需要文本列时关联book_texts（别名t）"""
+        if self.partitioned and with_texts:
+            return ("books b JOIN book_texts t "
+                    "ON t.source_file_id = b.source_file_id AND t.row_no = b.row_no")
+        return "books b"
+
+    def _select_list(self) -> str:
+        return ', '.join(
+            self._text_column(column) if column in TEXT_COLUMNS else f"b.{column}"
+            for column in STORED_COLUMNS
+        )
+
+    def _build_where_clause(self, **kwargs) -> tuple:
+        """根据搜索条件构建WHERE子句和参数
+
+        语种、源文件条件以b.language_id / b.source_file_id上的等值条件给出，
+        分区布局下MySQL可据此只扫描相关的分区和子分区。
+        """
+        conditions = []
+        params = []
+
+        if kwargs.get('file_id'):
+            conditions.append("b.file_id = %s")
+            params.append(kwargs['file_id'])
+        if kwargs.get('title'):
+            conditions.append(f"MATCH({self._text_column('title')}) AGAINST(%s IN BOOLEAN MODE)")
+            params.append(f"*{kwargs['title']}*")
+        if kwargs.get('author'):
+            conditions.append(f"MATCH({self._text_column('author')}) AGAINST(%s IN BOOLEAN MODE)")
+            params.append(f"*{kwargs['author']}*")
+        if kwargs.get('publisher'):
+            conditions.append(f"MATCH({self._text_column('publisher')}) AGAINST(%s IN BOOLEAN MODE)")
+            params.append(f"*{kwargs['publisher']}*")
+        if kwargs.get('language'):
+            self._append_lookup_condition(conditions, params, 'language_id', kwargs['language'])
+        if kwargs.get('year'):
+            conditions.append("b.publish_year = %s")
+            params.append(kwargs['year'])
+        if kwargs.get('format'):
+            self._append_lookup_condition(conditions, params, 'format_id', kwargs['format'])
+        if kwargs.get('source_file'):
+            self._append_lookup_condition(conditions, params, 'source_file_id', kwargs['source_file'])
+
+        # 构建WHERE子句
+        where_clause = " AND ".join(conditions) if conditions else "1"
+        return where_clause, params
+
+    def _build_search_query(self, **kwargs) -> tuple:
+        """根据搜索条件构建查询语句和参数，指定limit时只返回一页结果"""
+        where_clause, params = self._build_where_clause(**kwargs)
+
+        query = f"""
+            SELECT {self._select_list()}
+            FROM {self._from_clause()} 
+            WHERE {where_clause}
+            ORDER BY b.id
+        """
+        if kwargs.get('limit') is not None:
+            query += " LIMIT %s OFFSET %s"
+            params = params + [int(kwargs['limit']), int(kwargs.get('offset') or 0)]
+        return query, params
+
+    def _serialize_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """将字典编号还原为名称，并确保所有值都是JSON可序列化的"""
+        clean_row = {}
+        for key, value in row.items():
+            if key in DICTIONARY_COLUMNS:
+                table, key = DICTIONARY_COLUMNS[key]
+                # 编号从1开始，分区布局下语种未知时存为0
+                value = _lookups.lookup_name(self.db_config, table, value) if value else None
+            if isinstance(value, (int, str, float, bool, type(None))):
+                clean_row[key] = value
+            else:
+                clean_row[key] = str(value)
+        return clean_row
+
+    def _execute_guarded(self, conn, cursor, query: str, params: list,
+                         timeout: Optional[float], query_id: Optional[str]) -> list:
+        """在时限内执行查询并返回全部结果，超时或被取消时抛出相应异常"""
+        if timeout:
+            # 服务端时限：MySQL在超过MAX_EXECUTION_TIME后自行中止SELECT
+            query = query.replace('SELECT', f'SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */', 1)
+        if query_id:
+            # 查询编号会写入SQL注释，只接受字母、数字和连字符
+            if not QUERY_ID_PATTERN.match(query_id):
+                raise ValueError(f"无效的查询编号: {query_id}")
+            # 在语句中标记查询编号，取消请求可能由其他工作进程处理，需通过进程列表定位
+            query += f" /* query_id:{query_id} */"
+
+        watchdog = _QueryWatchdog(self.db_config, conn.connection_id, timeout) if timeout else None
+        try:
+            if watchdog:
+                watchdog.start()
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except Error as e:
+            if e.errno == ER_QUERY_TIMEOUT or (watchdog and watchdog.fired):
+                raise QueryTimeoutError(f"查询超过 {timeout} 秒时限，条件可能过于宽泛") from e
+            if e.errno == ER_QUERY_INTERRUPTED:
+                raise QueryCancelledError("查询已被取消") from e
+            raise
+        finally:
+            if watchdog:
+                watchdog.stop()
+
+    def search_books(self, timeout: Optional[float] = None, query_id: Optional[str] = None,
+                     **kwargs) -> List[Dict[str, Any]]:
+        """从数据库中搜索符合条件的书籍
+
+        指定timeout（秒）时超时抛出QueryTimeoutError；指定query_id时可通过
+        cancel_query取消，取消后抛出QueryCancelledError。数据库错误会向上抛出，
+        以免被当作"没有结果"返回并缓存。
+        """
         try:
             conn = mysql.connector.connect(**self.db_config)
             cursor = conn.cursor(dictionary=True)
 
-            # 构建查询条件
-            conditions = []
-            params = []
-            
-            if kwargs.get('file_id'):
-                conditions.append("file_id = %s")
-                params.append(kwargs['file_id'])
-            if kwargs.get('title'):
-                conditions.append("MATCH(title) AGAINST(%s IN BOOLEAN MODE)")
-                params.append(f"*{kwargs['title']}*")
-            if kwargs.get('author'):
-                conditions.append("MATCH(author) AGAINST(%s IN BOOLEAN MODE)")
-                params.append(f"*{kwargs['author']}*")
-            if kwargs.get('publisher'):
-                conditions.append("MATCH(publisher) AGAINST(%s IN BOOLEAN MODE)")
-                params.append(f"*{kwargs['publisher']}*")
-            if kwargs.get('language'):
-                conditions.append("language = %s")
-                params.append(kwargs['language'])
-            if kwargs.get('year'):
-                conditions.append("publish_year = %s")
-                params.append(kwargs['year'])
-            if kwargs.get('format'):
-                conditions.append("format = %s")
-                params.append(kwargs['format'])
-
-            # 构建WHERE子句
-            where_clause = " AND ".join(conditions) if conditions else "1"
-
-            # 执行查询，不限制结果数量
-            query = f"""
-                SELECT 
-                    id,
-                    file_id,
-                    title,
-                    author,
-                    publisher,
-                    language,
-                    publish_year,
-                    format,
-                    source_file
-                FROM books 
-                WHERE {where_clause}
-                ORDER BY id
-            """
-            cursor.execute(query, params)
-            
-            # 确保返回的是列表
-            results = list(cursor.fetchall())
+            # 执行查询，未指定limit时不限制结果数量
+            query, params = self._build_search_query(**kwargs)
+            rows = self._execute_guarded(conn, cursor, query, params, timeout, query_id)
             
             # 将所有结果转换为可序列化的字典
-            serializable_results = []
-            for row in results:
-                # 确保所有值都是JSON可序列化的
-                clean_row = {}
-                for key, value in row.items():
-                    if isinstance(value, (int, str, float, bool, type(None))):
-                        clean_row[key] = value
-                    else:
-                        clean_row[key] = str(value)
-                serializable_results.append(clean_row)
+            serializable_results = [self._serialize_row(row) for row in rows]
 
             total_count = len(serializable_results)
             logging.info(f"数据库查询完成，找到 {total_count} 条结果")
@@ -413,12 +562,192 @@ class BookSearcher:
 
         except Error as e:
             logging.error(f"数据库查询错误: {e}")
-            return []
+            raise
+        finally:
+            if conn.is_connected():
+                cursor.close()
+                conn.close()
+
+    def count_books(self, timeout: Optional[float] = None, query_id: Optional[str] = None,
+                    **kwargs) -> int:
+        """统计符合条件的书籍数量，时限和取消的处理同search_books"""
+        try:
+            conn = mysql.connector.connect(**self.db_config)
+            cursor = conn.cursor()
+
+            where_clause, params = self._build_where_clause(**kwargs)
+            # 没有文本条件时无需关联文本表
+            with_texts = any(kwargs.get(column) for column in TEXT_COLUMNS)
+            rows = self._execute_guarded(
+                conn, cursor, f"SELECT COUNT(*) FROM {self._from_clause(with_texts)} WHERE {where_clause}",
+                params, timeout, query_id
+            )
+            return rows[0][0]
+
+        except Error as e:
+            logging.error(f"数据库计数错误: {e}")
+            raise
+        finally:
+            if conn.is_connected():
+                cursor.close()
+                conn.close()
+
+    def cancel_query(self, query_id: str) -> int:
+        """终止带有指定查询编号的正在执行的查询，返回终止的数量"""
+        if not QUERY_ID_PATTERN.match(query_id or ''):
+            raise ValueError(f"无效的查询编号: {query_id}")
+
+        try:
+            conn = mysql.connector.connect(**self.db_config)
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                SELECT ID FROM information_schema.PROCESSLIST
+                WHERE INFO LIKE %s AND ID <> CONNECTION_ID()
+            """, (f"%/* query_id:{query_id} */%",))
+            connection_ids = [row[0] for row in cursor.fetchall()]
+            for connection_id in connection_ids:
+                cursor.execute(f"KILL QUERY {int(connection_id)}")
+            if connection_ids:
+                logging.info(f"已取消查询 {query_id}")
+            return len(connection_ids)
+
+        except Error as e:
+            logging.error(f"取消查询时发生错误: {e}")
+            return 0
         finally:
             if conn.is_connected():
                 cursor.close()
                 conn.close()
 
+    def iter_books(self, chunk_size: int = 5000, **kwargs) -> Iterator[Dict[str, Any]]:
+        """使用非缓冲（服务端）游标分块读取搜索结果，适用于大批量导出"""
+        conn = mysql.connector.connect(**self.db_config)
+        # 非缓冲游标：结果集留在服务端，每次fetchmany只拉取一块
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            query, params = self._build_search_query(**kwargs)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._serialize_row(row)
+        finally:
+            # 提前中止时结果集可能未读完，直接断开连接即可丢弃剩余数据
+            try:
+                cursor.close()
+            except Error:
+                pass
+            try:
+                conn.close()
+            except Error:
+                pass
+
+    def batch_lookup(self, values: List[str], field: str = 'file_id') -> Dict[str, Any]:
+        """批量查询文件编号或书名，返回每个输入的匹配结果和未匹配项"""
+        values = parse_lookup_values(values)
+        if field == 'file_id':
+            matches = self._lookup_file_ids(values)
+        elif field == 'title':
+            matches = self._lookup_titles(values)
+        else:
+            raise ValueError(f"不支持的批量查询字段: {field}")
+
+        misses = [value for value in values if value not in matches]
+        logging.info(f"批量查询完成: {len(values)} 个输入，命中 {len(matches)}，未命中 {len(misses)}")
+        return {'matches': matches, 'misses': misses}
+
+    def _lookup_file_ids(self, file_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """将文件编号写入临时表，通过一次连接查询完成精确匹配
+
+        临时表使用二进制排序规则，仅大小写不同的输入各占一行，结果按原始输入返回；
+        匹配方式与单条搜索相同（忽略大小写）。超过file_id列长度的输入不可能匹配。
+        """
+        matches = {}
+        file_ids = [value for value in file_ids if len(value) <= FILE_ID_MAX_LENGTH]
+        if not file_ids:
+            return matches
+
+        conn = mysql.connector.connect(**self.db_config)
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # 临时表仅对当前连接可见，连接关闭后自动删除
+            cursor.execute(f"""
+                CREATE TEMPORARY TABLE lookup_ids (
+                    input_id VARCHAR({FILE_ID_MAX_LENGTH}) PRIMARY KEY
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
+            """)
+            for start in range(0, len(file_ids), BATCH_INSERT_SIZE):
+                batch = file_ids[start:start + BATCH_INSERT_SIZE]
+                cursor.executemany(
+                    "INSERT INTO lookup_ids (input_id) VALUES (%s)",
+                    [(value,) for value in batch]
+                )
+
+            # 按books.file_id的排序规则比较，可以使用其索引
+            cursor.execute(f"""
+                SELECT l.input_id AS lookup_value, {self._select_list()}
+                FROM {self._from_clause()}
+                JOIN lookup_ids l ON b.file_id = l.input_id COLLATE utf8mb4_unicode_ci
+                ORDER BY b.id
+            """)
+            for row in cursor:
+                key = row.pop('lookup_value')
+                matches.setdefault(key, []).append(self._serialize_row(row))
+            return matches
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _lookup_titles(self, titles: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """将书名分片后由有限数量的连接并行做全文检索
+
+        只返回包含书名中全部词语的记录，按相关度排序，
+        避免仅有一个词相同的无关书籍被当作匹配。
+        """
+        matches = {}
+        if not titles:
+            return matches
+
+        n_workers = min(TITLE_LOOKUP_WORKERS, len(titles))
+        slices = [titles[i::n_workers] for i in range(n_workers)]
+
+        def lookup_slice(slice_titles):
+            # 每个线程只使用一个连接处理整片书名
+            result = {}
+            conn = mysql.connector.connect(**self.db_config)
+            cursor = conn.cursor(dictionary=True)
+            try:
+                query = f"""
+                    SELECT {self._select_list()}
+                    FROM {self._from_clause()}
+                    WHERE MATCH({self._text_column('title')}) AGAINST(%s IN BOOLEAN MODE)
+                    ORDER BY MATCH({self._text_column('title')}) AGAINST(%s) DESC
+                    LIMIT {TITLE_MATCH_LIMIT}
+                """
+                for title in slice_titles:
+                    cursor.execute(query, (title_match_query(title), title))
+                    rows = [self._serialize_row(row) for row in cursor.fetchall()]
+                    if rows:
+                        result[title] = rows
+                return result
+            finally:
+                cursor.close()
+                conn.close()
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for result in executor.map(lookup_slice, slices):
+                matches.update(result)
+
+        # 按输入顺序返回
+        return {title: matches[title] for title in titles if title in matches}
+
+    def suggest(self, field: str, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """返回字段的前缀联想候选"""
+        return lookup_suggestions(self.db_config, field, prefix, limit)
+
     def print_results(self, verbose: bool = False) -> None:
         """打印搜索结果"""
         if not self.search_results:
@@ -430,7 +759,7 @@ class BookSearcher:
         # 按文件分组显示结果
         results_by_file = {}
         for book in self.search_results:
-            source_file = book.get('源文件', 'unknown')
+            source_file = book.get('source_file') or 'unknown'
             if source_file not in results_by_file:
                 results_by_file[source_file] = []
             results_by_file[source_file].append(book)
@@ -442,15 +771,37 @@ class BookSearcher:
                 if verbose:
                     # 详细模式显示所有字段
                     for field, value in book.items():
-                        if field != '源文件':  # 不重复显示源文件
+                        if field != 'source_file':  # 不重复显示源文件
                             print(f"  {field}: {value}")
                 else:
                     # 简略模式只显示主要字段
-                    main_fields = ['书名', '作者', '出版社', '出版年份']
+                    main_fields = ['title', 'author', 'publisher', 'publish_year']
                     for field in main_fields:
                         if field in book:
                             print(f"  {field}: {book[field]}")
 
+    def get_dataset_version(self) -> str:
+        """返回标识当前数据集版本的字符串，数据加载后会发生变化"""
+        try:
+            conn = mysql.connector.connect(**self.db_config)
+            cursor = conn.cursor()
+            
+            # 两个查询都只读取索引端点或小表，代价很低
+            cursor.execute("SELECT COUNT(*), MAX(processed_at) FROM processed_files")
+            file_count, last_processed = cursor.fetchone()
+            cursor.execute("SELECT MAX(id) FROM books")
+            max_id = cursor.fetchone()[0]
+            
+            return f"{file_count}-{last_processed}-{max_id}"
+            
+        except Error as e:
+            logging.error(f"获取数据集版本时发生错误: {e}")
+            return ''
+        finally:
+            if conn.is_connected():
+                cursor.close()
+                conn.close()
+
     def get_statistics(self) -> Dict[str, Any]:
         """获取数据库统计信息"""
         try:
@@ -464,11 +815,18 @@ class BookSearcher:
             stats.update(cursor.fetchone())
             
             # 获取语言统计
+            # 先按语种编号分组（小整数索引列），再按名称合并：字典表区分大小写，
+            # 按utf8mb4_unicode_ci合并大小写不同的写法，与原language列的分组方式一致
             cursor.execute("""
-                SELECT language, COUNT(*) as count 
-                FROM books 
-                WHERE language IS NOT NULL 
-                GROUP BY language
+                SELECT MIN(l.name) as language, CAST(SUM(c.count) AS UNSIGNED) as count
+                FROM (
+                    SELECT language_id, COUNT(*) as count
+                    FROM books
+                    WHERE language_id > 0
+                    GROUP BY language_id
+                ) c
+                JOIN languages l ON l.id = c.language_id
+                GROUP BY l.name COLLATE utf8mb4_unicode_ci
             """)
             stats['languages'] = cursor.fetchall()
             
@@ -494,6 +852,7 @@ class BookSearcher:
 
 def main():
     """主函数"""
+    setup_logging()
     parser = argparse.ArgumentParser(description='快速搜索和检查书籍信息')
     parser.add_argument('--dir', '-d', default='.', help='Excel文件所在目录路径（默认为当前目录）')
     parser.add_argument('--verbose', '-v', action='store_true', help='显示详细信息')
@@ -508,7 +867,11 @@ def main():
     parser.add_argument('--language', help='语种')
     parser.add_argument('--year', type=int, help='出版年份')
     parser.add_argument('--format', help='文件格式')
-    parser.add_argument('--export', help='导出搜索结果到Excel文件')
+    parser.add_argument('--source-file', help='源文件名')
+    parser.add_argument('--export', help='流式导出搜索结果到指定文件（.csv或.xlsx）')
+    parser.add_argument('--batch-file', help='批量查询：每行一个文件编号或书名的文本文件')
+    parser.add_argument('--batch-field', choices=['file_id', 'title'], default='file_id', help='批量查询的字段（默认为文件编号）')
+    parser.add_argument('--export-format', choices=['csv', 'xlsx'], help='导出格式（默认按文件扩展名推断）')
     
     args = parser.parse_args()
     
@@ -516,20 +879,57 @@ def main():
         searcher = BookSearcher()
         searcher.chunk_size = args.chunk_size
         
-        # 构建搜索条件
+        # 构建搜索条件（搜索和导出共用）
         search_params = {
-            '文件编号': args.file_id,
-            '书名': args.title,
-            '作者': args.author,
-            '出版社': args.publisher,
-            '语种': args.language,
-            '出版年份': args.year,
-            '文件格式': args.format
+            'file_id': args.file_id,
+            'title': args.title,
+            'author': args.author,
+            'publisher': args.publisher,
+            'language': args.language,
+            'year': args.year,
+            'format': args.format,
+            'source_file': args.source_file
         }
         
         # 移除None值的参数
         search_params = {k: v for k, v in search_params.items() if v is not None}
         
+        # 批量查询模式
+        if args.batch_file:
+            with open(args.batch_file, encoding='utf-8-sig') as f:
+                values = parse_lookup_values(f)
+
+            start_time = datetime.now()
+            result = searcher.batch_lookup(values, field=args.batch_field)
+            end_time = datetime.now()
+
+            print(f"\n批量查询用时: {(end_time - start_time).total_seconds():.2f} 秒")
+            print(f"共 {len(values)} 个输入，命中 {len(result['matches'])} 个，未命中 {len(result['misses'])} 个")
+            if args.verbose:
+                for value, books in result['matches'].items():
+                    print(f"\n  {value}: {len(books)} 条匹配")
+                    for book in books:
+                        print(f"    [{book['file_id']}] {book['title']} - {book['author']}")
+            if result['misses']:
+                print("\n未命中:")
+                for value in result['misses']:
+                    print(f"  {value}")
+            return 0
+
+        # 导出模式：直接从服务端游标流式写出，不在内存中保留全部结果
+        if args.export:
+            from book_export import export_books
+
+            start_time = datetime.now()
+            count = export_books(
+                searcher.iter_books(**search_params),
+                args.export,
+                fmt=args.export_format
+            )
+            end_time = datetime.now()
+            print(f"\n已导出 {count} 条结果到: {args.export}（用时 {(end_time - start_time).total_seconds():.2f} 秒）")
+            return 0
+
         if not search_params:
             print("请提供至少一个搜索条件")
             parser.print_help()
@@ -537,20 +937,13 @@ def main():
         
         # 执行搜索
         start_time = datetime.now()
-        results = searcher.search_books(**search_params)
+        searcher.search_results = searcher.search_books(**search_params)
         end_time = datetime.now()
         
         # 打印结果
         print(f"\n搜索用时: {(end_time - start_time).total_seconds():.2f} 秒")
         searcher.print_results(args.verbose)
         
-        # 导出结果
-        if args.export and results:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            export_file = f"search_results_{timestamp}.xlsx"
-            pd.DataFrame(results).to_excel(export_file, index=False)
-            print(f"\n搜索结果已导出到: {export_file}")
-        
         return 0
         
     except Exception as e:
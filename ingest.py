@@ -0,0 +1,1212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Excel数据导入引擎
+
+解析（CPU密集）与数据库写入（I/O密集）分离为流水线：
+多个解析进程读取Excel并将数据块放入有界队列，主进程中少量写入线程
+各持有一个数据库连接，从队列取出数据块批量插入。队列已满时解析进程阻塞，
+从而形成背压；解析与提交可以同时进行，数据库连接数只与写入线程数有关。
+
+每个数据块提交时在同一事务中写入检查点，导入中断后再次运行会跳过
+已提交的行，从中断处继续。
+
+工作簿内容变化后重新导入时，先删除该工作簿旧版本的行；
+在分区布局下只需清空该工作簿对应的分区。
+"""
+
+import os
+import time
+import hashlib
+import logging
+import queue
+import threading
+import warnings
+import multiprocessing as mp
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Optional, Callable
+
+import mysql.connector
+from mysql.connector import Error
+
+# 解析进程放入队列的数据块行数，写入线程合并若干块为一次提交
+CHUNK_ROWS = 1000
+# 每次提交的初始行数及自适应调整的范围
+DEFAULT_BATCH_SIZE = 5000
+MIN_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 50000
+# 初始活跃写入线程（数据库连接）数量及自适应调整的范围
+DEFAULT_WRITERS = 4
+MIN_WRITERS = 1
+DEFAULT_MAX_WRITERS = 8
+# 每个写入线程对应的队列缓冲批次数
+QUEUE_BLOCKS_PER_WRITER = 4
+# 并发调节周期（秒）、吞吐量变化的容差及可接受的平均提交耗时（秒）
+GOVERNOR_INTERVAL = 10
+GOVERNOR_TOLERANCE = 0.05
+MAX_COMMIT_LATENCY = 2.0
+# 进度日志的输出间隔（秒）
+LOG_INTERVAL = 5
+
+INSERT_BOOKS_SQL = """
+    INSERT INTO books (
+        file_id, title, author, publisher,
+        language_id, publish_year, format_id, source_file_id
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# 分区布局：books按源文件LIST分区（每个工作簿一个分区），并按语种HASH子分区；
+# InnoDB分区表不支持FULLTEXT索引，书名等文本列放在不分区的book_texts表中
+TEXT_TABLE = 'book_texts'
+LANGUAGE_SUBPARTITIONS = 4
+# MySQL单表最多8192个分区（含子分区），每个工作簿占用LANGUAGE_SUBPARTITIONS个，
+# 另有一个占位分区p0，因此分区布局最多容纳2047个工作簿
+MYSQL_MAX_PARTITIONS = 8192
+MAX_PARTITIONED_FILES = MYSQL_MAX_PARTITIONS // LANGUAGE_SUBPARTITIONS - 1
+
+INSERT_PARTITIONED_BOOKS_SQL = """
+    INSERT INTO books (
+        source_file_id, row_no, file_id,
+        language_id, publish_year, format_id
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_TEXTS_SQL = """
+    INSERT INTO book_texts (
+        source_file_id, row_no, title, author, publisher
+    ) VALUES (%s, %s, %s, %s, %s)
+"""
+
+# 字典编码的低基数列：解析结果中的位置 -> 字典表及名称最大长度
+DICTIONARY_COLUMNS = {
+    4: ('languages', 50),
+    6: ('formats', 50),
+    7: ('source_files', 512),
+}
+
+# Excel列名及写入数据库时的最大长度（None表示不截断）
+EXCEL_COLUMNS = [
+    ('文件编号', 100),
+    ('书名', None),
+    ('作者', None),
+    ('出版社', None),
+    ('语种', 50),
+    ('出版年份', None),
+    ('文件格式', 50),
+]
+
+
+class PartitionLimitError(Exception):
+    """分区布局下工作簿数量超过MySQL的分区数上限"""
+
+
+INSERT_CHECKPOINT_SQL = """
+    INSERT INTO ingest_checkpoints (file_hash, file_path, row_start, row_end)
+    VALUES (%s, %s, %s, %s)
+"""
+
+
+def create_checkpoint_table(cursor) -> None:
+    """创建导入检查点表（已存在时不做任何修改）
+
+    每提交一个数据块，就在同一事务中记录该块在源文件中的行区间
+    [row_start, row_end)；文件全部完成后检查点随processed_files记录一起删除。
+    检查点按文件路径和哈希值区分，源文件被删除或修改后据此清理中断时写入的行。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+            file_hash VARCHAR(64) NOT NULL,
+            file_path VARCHAR(512) NOT NULL DEFAULT '',
+            row_start INT NOT NULL,
+            row_end INT NOT NULL,
+            committed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (file_path, file_hash, row_start)
+        ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+    """)
+    # 早期创建的检查点表没有file_path列，主键只有(file_hash, row_start)
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'ingest_checkpoints'
+        AND COLUMN_NAME = 'file_path'
+    """)
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            ALTER TABLE ingest_checkpoints
+            ADD COLUMN file_path VARCHAR(512) NOT NULL DEFAULT '' AFTER file_hash
+        """)
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'ingest_checkpoints'
+        AND INDEX_NAME = 'PRIMARY' AND COLUMN_NAME = 'file_path'
+    """)
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            ALTER TABLE ingest_checkpoints
+            DROP PRIMARY KEY, ADD PRIMARY KEY (file_path, file_hash, row_start)
+        """)
+
+
+def discard_stale_checkpoints(conn) -> int:
+    """清理过期的检查点，返回清理的文件数
+
+    中断的导入在再次运行前，源文件可能已被删除或修改（哈希不再相同），
+    这些检查点永远不会完成。中断前已提交的行按源文件删除，processed_files中
+    该路径的记录也一并删除，使该路径下次作为新文件完整导入。
+    """
+    cursor = conn.cursor()
+    try:
+        create_checkpoint_table(cursor)
+        cursor.execute("SELECT DISTINCT file_hash, file_path FROM ingest_checkpoints")
+        stale = [
+            (file_hash, file_path) for file_hash, file_path in cursor.fetchall()
+            if not (file_path and os.path.isfile(file_path) and file_md5(file_path) == file_hash)
+        ]
+        if not stale:
+            return 0
+
+        partitioned = is_partitioned(cursor)
+        for file_hash, file_path in stale:
+            if file_path:
+                _clear_source_name(cursor, file_path, partitioned)
+                cursor.execute("DELETE FROM processed_files WHERE file_path = %s", (file_path,))
+                logging.info(f"源文件已删除或修改，放弃上次未完成的导入: {file_path}")
+            else:
+                logging.warning(f"检查点未记录文件路径，无法删除其已写入的行: {file_hash}")
+            cursor.execute(
+                "DELETE FROM ingest_checkpoints WHERE file_path = %s AND file_hash = %s",
+                (file_path, file_hash)
+            )
+            conn.commit()
+        return len(stale)
+    finally:
+        cursor.close()
+
+
+def has_pending_checkpoints(conn) -> bool:
+    """是否存在中断后尚未完成、且仍可继续的导入（会先清理过期的检查点）"""
+    discard_stale_checkpoints(conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM ingest_checkpoints")
+        return cursor.fetchone()[0] > 0
+    finally:
+        cursor.close()
+
+
+def create_tables(cursor, partitioned: bool = False) -> None:
+    """删除旧表并创建导入所需的表，partitioned为True时使用分区布局
+
+    字典表只追加、不删除：查询进程缓存了编号与名称的对应关系，
+    重建字典表会使编号从1重新开始，正在运行的服务会把编号解码成错误的名称。
+    """
+    cursor.execute("DROP TABLE IF EXISTS books")
+    cursor.execute(f"DROP TABLE IF EXISTS {TEXT_TABLE}")
+    cursor.execute("DROP TABLE IF EXISTS processed_files")
+    cursor.execute("DROP TABLE IF EXISTS ingest_checkpoints")
+
+    _create_dictionary_tables(cursor)
+
+    # 创建已处理文件记录表
+    cursor.execute("""
+        CREATE TABLE processed_files (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            file_path VARCHAR(512) NOT NULL,
+            file_hash VARCHAR(64) NOT NULL,
+            last_modified TIMESTAMP,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_file_hash (file_hash),
+            UNIQUE KEY unique_file_path (file_path)
+        ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+    """)
+
+    # 创建书籍信息表
+    if partitioned:
+        _create_partitioned_books(cursor)
+    else:
+        cursor.execute("""
+            CREATE TABLE books (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                file_id VARCHAR(100),
+                title MEDIUMTEXT,
+                author MEDIUMTEXT,
+                publisher MEDIUMTEXT,
+                language_id SMALLINT UNSIGNED,
+                publish_year INT,
+                format_id SMALLINT UNSIGNED,
+                source_file_id INT UNSIGNED,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_file_id (file_id),
+                INDEX idx_language_id (language_id),
+                INDEX idx_format_id (format_id),
+                INDEX idx_source_file_id (source_file_id),
+                FULLTEXT INDEX idx_title (title),
+                FULLTEXT INDEX idx_author (author),
+                FULLTEXT INDEX idx_publisher (publisher)
+            ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+        """)
+
+    create_checkpoint_table(cursor)
+
+
+def _create_dictionary_tables(cursor) -> None:
+    """创建语种、文件格式、源文件的字典表（已存在时不做修改），books中只保存其编号
+
+    名称使用二进制排序规则，保证原始写法不被合并。
+    """
+    for table, max_length in DICTIONARY_COLUMNS.values():
+        id_type = 'INT UNSIGNED' if table == 'source_files' else 'SMALLINT UNSIGNED'
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id {id_type} AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR({max_length}) NOT NULL,
+                UNIQUE KEY unique_name (name)
+            ) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
+        """)
+
+
+# 旧版books表中以字符串保存的列 -> (字典表, 编号列, 编号列类型)
+LEGACY_DICTIONARY_COLUMNS = {
+    'language': ('languages', 'language_id', 'SMALLINT UNSIGNED'),
+    'format': ('formats', 'format_id', 'SMALLINT UNSIGNED'),
+    'source_file': ('source_files', 'source_file_id', 'INT UNSIGNED'),
+}
+
+
+def _books_columns(cursor) -> set:
+    cursor.execute("""
+        SELECT COLUMN_NAME
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'books'
+    """)
+    return {row[0] for row in cursor.fetchall()}
+
+
+# 迁移期间持有的MySQL命名锁，防止多个进程同时迁移
+MIGRATION_LOCK = 'book_search_migrate_books'
+MIGRATION_LOCK_TIMEOUT = 3600
+
+
+def migrate_legacy_books(conn) -> None:
+    """将旧版books表原地迁移为字典编码结构，保留全部数据
+
+    依次：建立字典表并写入各列的全部取值，添加编号列及索引，按名称回填编号，
+    最后删除原字符串列。每一步都可重复执行，迁移中断后再次调用会从中断处继续。
+    由load_xlsx.py --migrate显式执行，查询进程遇到旧版结构时拒绝启动。
+    多个进程同时调用时，后到的进程等待先到的进程迁移完成后直接返回。
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("等待其他进程迁移books表超时")
+
+        columns = _books_columns(cursor)
+        if not columns & LEGACY_DICTIONARY_COLUMNS.keys():
+            return
+        logging.warning("检测到旧版books表结构，开始迁移（数据量大时可能需要较长时间）...")
+        _create_dictionary_tables(cursor)
+        create_checkpoint_table(cursor)
+
+        cursor.execute("""
+            SELECT INDEX_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'books'
+        """)
+        indexes = {row[0] for row in cursor.fetchall()}
+        if 'idx_file_id' not in indexes:
+            cursor.execute("ALTER TABLE books ADD INDEX idx_file_id (file_id)")
+
+        for column, (table, id_column, id_type) in LEGACY_DICTIONARY_COLUMNS.items():
+            if column not in columns:
+                continue
+            logging.info(f"迁移books.{column}到字典表{table}...")
+            # 按二进制排序规则去重，大小写不同的写法各自保留
+            cursor.execute(f"""
+                INSERT IGNORE INTO {table} (name)
+                SELECT DISTINCT {column} COLLATE utf8mb4_bin
+                FROM books
+                WHERE {column} IS NOT NULL
+            """)
+            conn.commit()
+
+            if id_column not in columns:
+                cursor.execute(f"""
+                    ALTER TABLE books
+                    ADD COLUMN {id_column} {id_type},
+                    ADD INDEX idx_{id_column} ({id_column})
+                """)
+            cursor.execute(f"""
+                UPDATE books b
+                JOIN {table} d ON d.name = b.{column} COLLATE utf8mb4_bin
+                SET b.{id_column} = d.id
+            """)
+            conn.commit()
+
+        legacy = [column for column in LEGACY_DICTIONARY_COLUMNS if column in columns]
+        if legacy:
+            cursor.execute(
+                "ALTER TABLE books " + ", ".join(f"DROP COLUMN {column}" for column in legacy)
+            )
+        logging.info("books表迁移完成")
+    finally:
+        try:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchone()
+        finally:
+            cursor.close()
+
+
+def _create_partitioned_books(cursor) -> None:
+    """创建分区布局的books表和存放文本列的book_texts表
+
+    分区列必须包含在每个唯一键中，因此主键为(id, source_file_id, language_id)，
+    且语种编号不允许为NULL（0表示未知）。两表通过(source_file_id, row_no)关联，
+    row_no为行在源文件中的序号。新工作簿的分区在导入时按需添加，
+    受MySQL分区数限制最多容纳MAX_PARTITIONED_FILES个工作簿。
+    """
+    cursor.execute(f"""
+        CREATE TABLE books (
+            id INT AUTO_INCREMENT,
+            source_file_id INT UNSIGNED NOT NULL,
+            row_no INT NOT NULL,
+            file_id VARCHAR(100),
+            language_id SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+            publish_year INT,
+            format_id SMALLINT UNSIGNED,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, source_file_id, language_id),
+            INDEX idx_row (source_file_id, row_no),
+            INDEX idx_file_id (file_id),
+            INDEX idx_language_id (language_id),
+            INDEX idx_format_id (format_id)
+        ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+        PARTITION BY LIST (source_file_id)
+        SUBPARTITION BY HASH (language_id) SUBPARTITIONS {LANGUAGE_SUBPARTITIONS} (
+            PARTITION p0 VALUES IN (0)
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE {TEXT_TABLE} (
+            source_file_id INT UNSIGNED NOT NULL,
+            row_no INT NOT NULL,
+            title MEDIUMTEXT,
+            author MEDIUMTEXT,
+            publisher MEDIUMTEXT,
+            PRIMARY KEY (source_file_id, row_no),
+            FULLTEXT INDEX idx_title (title),
+            FULLTEXT INDEX idx_author (author),
+            FULLTEXT INDEX idx_publisher (publisher)
+        ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+    """)
+
+
+def is_partitioned(cursor) -> bool:
+    """当前数据库是否使用分区布局"""
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (TEXT_TABLE,))
+    return cursor.fetchone()[0] > 0
+
+
+def ensure_partitions(cursor, source_file_ids) -> None:
+    """为尚无分区的源文件编号添加分区，超过分区数上限时抛出PartitionLimitError"""
+    cursor.execute("""
+        SELECT DISTINCT PARTITION_NAME
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'books'
+    """)
+    existing = {row[0] for row in cursor.fetchall()}
+    missing = {int(i) for i in source_file_ids if f"p{int(i)}" not in existing}
+    if len(existing) + len(missing) > MAX_PARTITIONED_FILES + 1:
+        raise PartitionLimitError(
+            f"分区布局最多容纳 {MAX_PARTITIONED_FILES} 个工作簿"
+            f"（MySQL单表分区上限 {MYSQL_MAX_PARTITIONS}），"
+            f"已有 {len(existing) - 1} 个，新增 {len(missing)} 个；请改用普通布局重新导入"
+        )
+    for source_file_id in sorted(set(source_file_ids)):
+        if f"p{int(source_file_id)}" not in existing:
+            cursor.execute(
+                f"ALTER TABLE books ADD PARTITION "
+                f"(PARTITION p{int(source_file_id)} VALUES IN ({int(source_file_id)}))"
+            )
+
+
+def clear_source_file(cursor, source_file_id: int, partitioned: bool) -> None:
+    """删除某个源文件的全部行；分区布局下直接清空该文件的分区"""
+    if partitioned:
+        cursor.execute(f"ALTER TABLE books TRUNCATE PARTITION p{int(source_file_id)}")
+        cursor.execute(f"DELETE FROM {TEXT_TABLE} WHERE source_file_id = %s", (source_file_id,))
+    else:
+        cursor.execute("DELETE FROM books WHERE source_file_id = %s", (source_file_id,))
+
+
+def _clear_source_name(cursor, file_path: str, partitioned: bool) -> bool:
+    """按源文件名删除该文件的全部行，返回该源文件是否存在"""
+    cursor.execute("SELECT id FROM source_files WHERE name = %s", (Path(file_path).name[:512],))
+    row = cursor.fetchone()
+    if row:
+        clear_source_file(cursor, row[0], partitioned)
+    return row is not None
+
+
+def _clear_previous_version(db_config: dict, file_path: str, partitioned: bool) -> None:
+    """重新导入工作簿前，删除该路径以前导入的行（不存在时不做任何操作）"""
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    try:
+        if _clear_source_name(cursor, file_path, partitioned):
+            conn.commit()
+            logging.info(f"已删除该工作簿以前导入的数据: {Path(file_path).name}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def file_md5(file_path: str) -> str:
+    """计算文件的MD5哈希值"""
+    hash_md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def read_excel_rows(file_path: str) -> List[tuple]:
+    """读取Excel文件并转换为可直接插入数据库的元组列表"""
+    import pandas as pd
+
+    # openpyxl对表格样式等的警告对导入没有意义
+    warnings.filterwarnings('ignore')
+    df = pd.read_excel(
+        file_path,
+        dtype={
+            '文件编号': str,
+            '书名': str,
+            '作者': str,
+            '出版社': str,
+            '语种': str,
+            '出版年份': 'Int64',
+            '文件格式': str
+        }
+    )
+
+    # 按列整体转换，避免逐行iterrows的开销
+    columns = []
+    for name, max_length in EXCEL_COLUMNS:
+        if name not in df.columns:
+            columns.append([None] * len(df))
+            continue
+        series = df[name]
+        values = series.astype(object).where(series.notna(), None).tolist()
+        if name == '出版年份':
+            columns.append([int(v) if v is not None else None for v in values])
+        else:
+            columns.append([
+                (str(v)[:max_length] if max_length else str(v)) if v is not None else None
+                for v in values
+            ])
+
+    source_file = Path(file_path).name[:512]
+    columns.append([source_file] * len(df))
+    return list(zip(*columns))
+
+
+def _uncovered_chunks(total_rows: int, committed: List[tuple], chunk_rows: int):
+    """跳过检查点中已提交的行区间，返回剩余行的(起始, 结束)分块"""
+    chunks = []
+    position = 0
+    for row_start, row_end in sorted(committed) + [(total_rows, total_rows)]:
+        row_start = min(row_start, total_rows)
+        while position < row_start:
+            end = min(position + chunk_rows, row_start)
+            chunks.append((position, end))
+            position = end
+        position = max(position, row_end)
+    return chunks
+
+
+def _parse_worker(task_queue, batch_queue, processed: Dict[str, str],
+                  checkpoints: Dict[tuple, List[tuple]], chunk_rows: int,
+                  db_config: dict, partitioned: bool) -> None:
+    """解析进程：逐个读取文件，将数据块放入有界队列"""
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        file_path, file_hash = task
+        try:
+            if file_hash is None:
+                # 计算哈希值时文件不可读，重新计算以报告错误
+                file_hash = file_md5(file_path)
+
+            # 检查文件是否已处理
+            if processed.get(file_path) == file_hash:
+                logging.info(f"文件已处理过且未修改，跳过: {file_path}")
+                batch_queue.put(('skip', file_path))
+                continue
+            if file_hash in processed.values():
+                logging.info(f"发现相同内容的文件，跳过: {file_path}")
+                batch_queue.put(('skip', file_path))
+                continue
+
+            rows = read_excel_rows(file_path)
+            committed = checkpoints.get((file_path, file_hash), [])
+
+            # 按路径对应的源文件删除以前导入的行：内容已变化的工作簿，
+            # 或以前的记录已被清理的路径（从检查点继续时已删除过，不再删除）
+            if not committed:
+                _clear_previous_version(db_config, file_path, partitioned)
+            chunks = _uncovered_chunks(len(rows), committed, chunk_rows)
+            if committed:
+                remaining = sum(end - start for start, end in chunks)
+                logging.info(f"从检查点继续导入 {Path(file_path).name}: 剩余 {remaining}/{len(rows)} 行")
+
+            for start, end in chunks:
+                # 队列已满时在此阻塞，等待写入线程消费
+                batch_queue.put(('chunk', file_path, start, rows[start:end], file_hash))
+
+            batch_queue.put(('end', file_path, {
+                'file_hash': file_hash,
+                'last_modified': datetime.fromtimestamp(os.path.getmtime(file_path)),
+                'total_rows': len(rows),
+                'n_chunks': len(chunks),
+            }))
+        except Exception as e:
+            logging.error(f"解析文件时发生错误 {file_path}: {str(e)}")
+            batch_queue.put(('error', file_path, str(e)))
+
+
+class _FileProgress:
+    """跟踪每个文件已提交的数据块，所有块提交后才记录为已处理"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.committed = {}
+        self.expected = {}
+        self.failed = set()
+
+    def chunk_committed(self, file_path: str) -> Optional[dict]:
+        with self.lock:
+            self.committed[file_path] = self.committed.get(file_path, 0) + 1
+            return self._take_if_complete(file_path)
+
+    def file_parsed(self, file_path: str, meta: dict) -> Optional[dict]:
+        with self.lock:
+            self.expected[file_path] = meta
+            return self._take_if_complete(file_path)
+
+    def fail(self, file_path: str) -> bool:
+        """标记文件失败，首次标记时返回True"""
+        with self.lock:
+            if file_path in self.failed:
+                return False
+            self.failed.add(file_path)
+            return True
+
+    def _take_if_complete(self, file_path: str) -> Optional[dict]:
+        meta = self.expected.get(file_path)
+        if meta is None or file_path in self.failed:
+            return None
+        if self.committed.get(file_path, 0) < meta['n_chunks']:
+            return None
+        # 只返回一次，由完成最后一块的线程负责记录
+        del self.expected[file_path]
+        return meta
+
+
+class ConcurrencyGovernor:
+    """根据提交吞吐量和延迟在运行时调整活跃写入线程数和批量大小
+
+    每个调整周期计算已提交行数/秒，采用爬山法，两个参数各自记录调整方向：
+    以当前设置的吞吐量为基准试探一步，若吞吐量提升则沿同一方向继续；
+    下降或持平则撤销这一步，该参数下次改为反方向尝试，并换另一个参数，
+    撤销后的设置在下一周期重新测量基准。提交延迟超过上限时优先缩小批量，
+    其次减少写入线程，以缓解锁竞争。
+    """
+
+    def __init__(self, max_writers: int, initial_writers: int = DEFAULT_WRITERS,
+                 batch_size: int = DEFAULT_BATCH_SIZE, interval: float = GOVERNOR_INTERVAL):
+        self.max_writers = max_writers
+        self.active_writers = max(MIN_WRITERS, min(initial_writers, max_writers))
+        self.batch_size = batch_size
+        self.interval = interval
+
+        self._condition = threading.Condition()
+        self._released = False
+        self._knob = 'writers'
+        self._directions = {'writers': 1, 'batch_size': 1}
+        # 当前设置的吞吐量基准，及基准测量后试探的一步(参数, 方向, 调整前的取值)
+        self._baseline = None
+        self._pending = None
+        self._best = None
+        self._reset_window(time.time())
+
+    def _reset_window(self, now: float) -> None:
+        self._window_start = now
+        self._window_rows = 0
+        self._window_commits = 0
+        self._window_latency = 0.0
+
+    def wait_active(self, index: int) -> None:
+        """编号超出活跃数量的写入线程在此等待"""
+        with self._condition:
+            while not self._released and index >= self.active_writers:
+                self._condition.wait()
+
+    def release_all(self) -> None:
+        """收尾阶段唤醒所有写入线程"""
+        with self._condition:
+            self._released = True
+            self._condition.notify_all()
+
+    def record_commit(self, rows: int, latency: float) -> None:
+        """记录一次提交，周期结束时调整参数"""
+        with self._condition:
+            self._window_rows += rows
+            self._window_commits += 1
+            self._window_latency += latency
+
+            now = time.time()
+            elapsed = now - self._window_start
+            if elapsed < self.interval:
+                return
+
+            throughput = self._window_rows / elapsed
+            avg_latency = self._window_latency / self._window_commits
+            self._reset_window(now)
+            self._adjust(throughput, avg_latency)
+            self._condition.notify_all()
+
+    def _adjust(self, throughput: float, avg_latency: float) -> None:
+        if self._best is None or throughput > self._best[0]:
+            self._best = (throughput, self.active_writers, self.batch_size)
+
+        if avg_latency > MAX_COMMIT_LATENCY:
+            # 提交过慢，说明数据库已过载；这一步不参与撤销，下一周期重新测量基准
+            self._baseline = None
+            self._pending = None
+            for knob in ('batch_size', 'writers'):
+                self._directions[knob] = -1
+                if self._step(knob, -1):
+                    self._knob = knob
+                    break
+        elif self._pending is not None and throughput <= self._baseline * (1 + GOVERNOR_TOLERANCE):
+            # 上一步没有带来提升：撤销，下次反方向尝试该参数，并换另一个参数
+            knob, direction, previous = self._pending
+            self._set(knob, previous)
+            self._directions[knob] = -direction
+            self._knob = self._other(knob)
+            self._baseline = None
+            self._pending = None
+        else:
+            # 首个周期、撤销后重新测量，或上一步提升了吞吐：以本周期为基准继续试探
+            self._baseline = throughput
+            self._pending = self._explore()
+
+        logging.info(
+            f"写入吞吐 {throughput:.0f} 行/秒，平均提交耗时 {avg_latency:.2f} 秒，"
+            f"调整为 {self.active_writers} 个写入线程、批量 {self.batch_size} 行"
+        )
+
+    @staticmethod
+    def _other(knob: str) -> str:
+        return 'batch_size' if knob == 'writers' else 'writers'
+
+    def _explore(self) -> Optional[tuple]:
+        """沿当前参数的方向试探一步，到达边界时改为反方向或换参数
+
+        返回(参数, 方向, 调整前的取值)，两个参数都无法调整时返回None。
+        """
+        for knob in (self._knob, self._other(self._knob)):
+            for direction in (self._directions[knob], -self._directions[knob]):
+                previous = self._get(knob)
+                if self._step(knob, direction):
+                    self._knob = knob
+                    self._directions[knob] = direction
+                    return knob, direction, previous
+        return None
+
+    def _get(self, knob: str) -> int:
+        return self.active_writers if knob == 'writers' else self.batch_size
+
+    def _set(self, knob: str, value: int) -> None:
+        if knob == 'writers':
+            self.active_writers = value
+        else:
+            self.batch_size = value
+
+    def _step(self, knob: str, direction: int) -> bool:
+        """调整一个参数，返回取值是否发生变化"""
+        if knob == 'writers':
+            value = max(MIN_WRITERS, min(self.max_writers, self.active_writers + direction))
+        elif direction > 0:
+            value = min(MAX_BATCH_SIZE, self.batch_size * 2)
+        else:
+            value = max(MIN_BATCH_SIZE, self.batch_size // 2)
+        changed = value != self._get(knob)
+        self._set(knob, value)
+        return changed
+
+    def summary(self) -> str:
+        """本次运行的最终设置及吞吐峰值时的设置"""
+        text = f"最终设置: {self.active_writers} 个写入线程、批量 {self.batch_size} 行"
+        if self._best:
+            throughput, writers, batch_size = self._best
+            text += f"；峰值吞吐 {throughput:.0f} 行/秒（{writers} 个写入线程、批量 {batch_size} 行）"
+        return text
+
+
+class _DictionaryEncoder:
+    """将低基数的字符串列编码为字典表编号，编号在进程内缓存
+
+    新出现的取值使用独立连接立即写入字典表并提交，
+    这样即使某个数据批次回滚，已缓存的编号仍然有效。
+    """
+
+    def __init__(self, db_config: dict, partitioned: bool = False):
+        self.db_config = db_config
+        self.partitioned = partitioned
+        self.lock = threading.Lock()
+        self.ids = {table: {} for table, _ in DICTIONARY_COLUMNS.values()}
+        self.conn = None
+
+    def load(self, cursor) -> None:
+        """读取字典表中已有的全部取值"""
+        for table in self.ids:
+            cursor.execute(f"SELECT id, name FROM {table}")
+            self.ids[table] = {name: id_ for id_, name in cursor.fetchall()}
+
+    def encode(self, rows: List[tuple]) -> List[tuple]:
+        """将行中的字典列替换为编号"""
+        with self.lock:
+            for position, (table, _) in DICTIONARY_COLUMNS.items():
+                missing = {row[position] for row in rows if row[position] is not None} - self.ids[table].keys()
+                if missing:
+                    self._add(table, missing)
+
+            encoded = []
+            for row in rows:
+                row = list(row)
+                for position, (table, _) in DICTIONARY_COLUMNS.items():
+                    if row[position] is not None:
+                        row[position] = self.ids[table][row[position]]
+                encoded.append(tuple(row))
+            return encoded
+
+    def _add(self, table: str, names: set) -> None:
+        if self.conn is None:
+            self.conn = mysql.connector.connect(**self.db_config)
+        cursor = self.conn.cursor()
+        try:
+            self._insert_names(cursor, table, names)
+        except Exception:
+            # 连接可能已断开，丢弃后下次重新建立
+            self.close()
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Error:
+                pass
+
+    def _insert_names(self, cursor, table: str, names: set) -> None:
+        names = list(names)
+        cursor.executemany(f"INSERT IGNORE INTO {table} (name) VALUES (%s)", [(name,) for name in names])
+        self.conn.commit()
+        placeholders = ', '.join(['%s'] * len(names))
+        cursor.execute(f"SELECT id, name FROM {table} WHERE name IN ({placeholders})", names)
+        self.ids[table].update({name: id_ for id_, name in cursor.fetchall()})
+
+        # 仅尾部空格不同的取值在比较时视为相同，返回的名称与输入不一致，逐个补查
+        for name in names:
+            if name not in self.ids[table]:
+                cursor.execute(f"SELECT id FROM {table} WHERE name = %s", (name,))
+                self.ids[table][name] = cursor.fetchone()[0]
+
+        # 分区布局下新源文件需要先有对应的分区才能写入
+        if self.partitioned and table == 'source_files':
+            ensure_partitions(cursor, [self.ids[table][name] for name in names])
+
+    def close(self) -> None:
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Error:
+                pass
+            self.conn = None
+
+
+class _WriterConnection:
+    """写入线程的数据库连接，首次使用时才建立"""
+
+    def __init__(self, db_config: dict):
+        self.db_config = db_config
+        self.conn = None
+        self.cursor = None
+
+    def open(self):
+        if self.conn is None:
+            self.conn = mysql.connector.connect(**self.db_config)
+            self.cursor = self.conn.cursor()
+        return self.conn, self.cursor
+
+    def rollback(self) -> None:
+        """回滚当前事务；连接已断开时丢弃连接，下次使用时重新建立"""
+        if self.conn is None:
+            return
+        try:
+            self.conn.rollback()
+        except Error:
+            self.reset()
+
+    def reset(self) -> None:
+        """丢弃连接（忽略关闭时的错误）"""
+        try:
+            self.close()
+        except Error:
+            pass
+        self.conn = None
+        self.cursor = None
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.cursor.close()
+            self.conn.close()
+
+
+class IngestEngine:
+    """解析进程 + 有界队列 + 写入线程的流水线导入引擎"""
+
+    def __init__(self, db_config: dict, n_parsers: Optional[int] = None,
+                 n_writers: int = DEFAULT_WRITERS, max_writers: int = DEFAULT_MAX_WRITERS,
+                 batch_size: int = DEFAULT_BATCH_SIZE, adaptive: bool = True):
+        self.db_config = db_config
+        self.n_parsers = n_parsers or max(1, mp.cpu_count() - 1)
+        self.n_writers = n_writers
+        # 非自适应模式下写入线程数和批量大小固定不变
+        self.max_writers = max(max_writers, n_writers) if adaptive else n_writers
+        self.batch_size = batch_size
+        self.adaptive = adaptive
+        # 运行时根据数据库中的表结构确定
+        self.partitioned = False
+
+    def _ensure_run_partitions(self, cursor, files: List[str]) -> None:
+        """开始导入前为本次的工作簿补齐分区，并确认分区数足够容纳新工作簿
+
+        字典表在重新建表后仍然保留以前全部工作簿的编号，只处理本次导入的文件；
+        提前检查可以避免导入中途新文件全部失败。
+        """
+        cursor.execute("""
+            SELECT DISTINCT PARTITION_NAME
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'books'
+        """)
+        existing = {row[0] for row in cursor.fetchall()}
+        known = self._encoder.ids['source_files']
+        names = {Path(f).name[:512] for f in files}
+        missing = {name for name in names if f"p{known.get(name)}" not in existing}
+        if len(existing) - 1 + len(missing) > MAX_PARTITIONED_FILES:
+            raise PartitionLimitError(
+                f"分区布局最多容纳 {MAX_PARTITIONED_FILES} 个工作簿"
+                f"（MySQL单表分区上限 {MYSQL_MAX_PARTITIONS}），"
+                f"已有 {len(existing) - 1} 个，本次新增 {len(missing)} 个；请改用普通布局重新导入"
+            )
+        # 已有编号但缺少分区的工作簿：上次中断时未建分区，或重新建表后再次导入
+        ensure_partitions(cursor, [known[name] for name in missing if name in known])
+
+    def _load_state(self, files: List[str]) -> tuple:
+        """读取已处理文件的路径和哈希值，以及未完成文件的检查点"""
+        conn = mysql.connector.connect(**self.db_config)
+        # 先放弃源文件已删除或修改的未完成导入，否则其部分数据会一直残留
+        discard_stale_checkpoints(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT file_path, file_hash FROM processed_files")
+            processed = dict(cursor.fetchall())
+
+            cursor.execute("SELECT file_path, file_hash, row_start, row_end FROM ingest_checkpoints")
+            checkpoints = {}
+            for file_path, file_hash, row_start, row_end in cursor.fetchall():
+                checkpoints.setdefault((file_path, file_hash), []).append((row_start, row_end))
+
+            self._encoder.partitioned = self.partitioned = is_partitioned(cursor)
+            self._encoder.load(cursor)
+            if self.partitioned:
+                self._ensure_run_partitions(cursor, files)
+            return processed, checkpoints
+        finally:
+            cursor.close()
+            conn.close()
+
+    @staticmethod
+    def _plan_files(files: List[str], processed: Dict[str, str],
+                    checkpoints: Dict[tuple, List[tuple]]) -> tuple:
+        """计算各文件的哈希值，本次导入中内容相同的文件只保留一个
+
+        内容相同的文件若同时解析，会以相同的内容写入两份数据。保留的文件依次优先选择：
+        有未完成检查点的、已以该内容导入过的、列表中靠前的，使中断后再次运行时选择不变。
+        返回(解析任务列表, 跳过的文件列表)，解析任务为(文件路径, 哈希值)。
+        """
+        hashes = {}
+        for file_path in files:
+            try:
+                hashes[file_path] = file_md5(file_path)
+            except OSError:
+                # 交给解析进程报告错误
+                hashes[file_path] = None
+
+        order = {file_path: i for i, file_path in enumerate(files)}
+
+        def preference(file_path):
+            file_hash = hashes[file_path]
+            return ((file_path, file_hash) not in checkpoints,
+                    processed.get(file_path) != file_hash,
+                    order[file_path])
+
+        kept = {}
+        for file_path in sorted(files, key=preference):
+            if hashes[file_path] is not None:
+                kept.setdefault(hashes[file_path], file_path)
+
+        tasks = []
+        duplicates = []
+        for file_path in files:
+            file_hash = hashes[file_path]
+            if file_hash is None or kept[file_hash] == file_path:
+                tasks.append((file_path, file_hash))
+            else:
+                logging.info(f"发现相同内容的文件，跳过: {file_path}（与 {kept[file_hash]} 相同）")
+                duplicates.append(file_path)
+        return tasks, duplicates
+
+    def run(self, files: List[str],
+            progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """导入文件列表，返回成功、跳过和失败的文件数"""
+        files = [str(f) for f in files]
+        n_parsers = min(self.n_parsers, len(files)) or 1
+        self._encoder = _DictionaryEncoder(self.db_config)
+        processed, checkpoints = self._load_state(files)
+        tasks, duplicates = self._plan_files(files, processed, checkpoints)
+
+        task_queue = mp.Queue()
+        for task in tasks:
+            task_queue.put(task)
+        for _ in range(n_parsers):
+            task_queue.put(None)
+
+        # 有界队列：写入跟不上时解析进程阻塞
+        batch_queue = mp.Queue(
+            maxsize=self.max_writers * QUEUE_BLOCKS_PER_WRITER * max(1, self.batch_size // CHUNK_ROWS)
+        )
+
+        parsers = [
+            mp.Process(target=_parse_worker,
+                       args=(task_queue, batch_queue, processed, checkpoints, CHUNK_ROWS,
+                             self.db_config, self.partitioned),
+                       daemon=True)
+            for _ in range(n_parsers)
+        ]
+        for parser in parsers:
+            parser.start()
+
+        self._summary = {'loaded': 0, 'skipped': 0, 'failed': 0}
+        self._summary_lock = threading.Lock()
+        self._file_progress = _FileProgress()
+        self._rows_committed = 0
+        self._last_log_time = time.time()
+        self._progress = progress
+        self._total_files = len(files)
+        for file_path in duplicates:
+            self._count('skipped')
+        self._governor = ConcurrencyGovernor(
+            self.max_writers,
+            initial_writers=self.n_writers,
+            batch_size=self.batch_size,
+            interval=GOVERNOR_INTERVAL if self.adaptive else float('inf')
+        )
+        logging.info(
+            f"开始导入: {n_parsers} 个解析进程，{self.n_writers}/{self.max_writers} 个写入线程，"
+            f"批量 {self.batch_size} 行{'（自适应）' if self.adaptive else ''}"
+        )
+
+        writers = [
+            threading.Thread(target=self._write_worker, args=(index, batch_queue), daemon=True)
+            for index in range(self.max_writers)
+        ]
+        for writer in writers:
+            writer.start()
+
+        for parser in parsers:
+            parser.join()
+        # 唤醒所有写入线程，确保每个线程都能取到结束标记
+        self._governor.release_all()
+        for _ in writers:
+            batch_queue.put(None)
+        for writer in writers:
+            writer.join()
+        self._encoder.close()
+
+        logging.info(
+            f"导入完成: 成功 {self._summary['loaded']}，跳过 {self._summary['skipped']}，"
+            f"失败 {self._summary['failed']}，共写入 {self._rows_committed} 行"
+        )
+        logging.info(self._governor.summary())
+        return dict(self._summary)
+
+    def _count(self, key: str) -> None:
+        with self._summary_lock:
+            self._summary[key] += 1
+            done = sum(self._summary.values())
+        if self._progress:
+            self._progress(done, self._total_files)
+
+    def _write_worker(self, index: int, batch_queue) -> None:
+        """写入线程：持有一个连接，将若干数据块合并为一次提交"""
+        db = _WriterConnection(self.db_config)
+        try:
+            while True:
+                self._governor.wait_active(index)
+                message = batch_queue.get()
+                if message is None:
+                    break
+                if message[0] != 'chunk':
+                    self._run_guarded(db, [message], self._handle_control, db, message)
+                    continue
+
+                # 凑满当前批量大小后再提交；非数据消息在提交之后处理
+                chunks = [message]
+                deferred = []
+                rows = len(message[3])
+                stop = False
+                while rows < self._governor.batch_size:
+                    try:
+                        message = batch_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if message is None:
+                        stop = True
+                        break
+                    if message[0] == 'chunk':
+                        chunks.append(message)
+                        rows += len(message[3])
+                    else:
+                        deferred.append(message)
+
+                self._run_guarded(db, chunks, self._write_chunks, db, chunks)
+                for message in deferred:
+                    self._run_guarded(db, [message], self._handle_control, db, message)
+                if stop:
+                    break
+        finally:
+            db.close()
+
+    def _run_guarded(self, db: _WriterConnection, messages: List[tuple], action, *args) -> None:
+        """执行写入操作；出现未预料的错误时将相关文件记为失败并丢弃连接
+
+        写入线程不能因异常退出，否则队列无人消费，解析进程会一直阻塞。
+        """
+        try:
+            action(*args)
+        except Exception as e:
+            for file_path in {message[1] for message in messages}:
+                logging.error(f"写入线程处理文件时发生错误 {file_path}: {str(e)}")
+                self._fail(file_path)
+            db.reset()
+
+    def _fail(self, file_path: str) -> None:
+        if self._file_progress.fail(file_path):
+            self._count('failed')
+
+    def _handle_control(self, db: _WriterConnection, message: tuple) -> None:
+        kind, file_path = message[0], message[1]
+        if kind == 'skip':
+            self._count('skipped')
+        elif kind == 'error':
+            self._fail(file_path)
+        elif kind == 'end':
+            meta = self._file_progress.file_parsed(file_path, message[2])
+            if meta:
+                self._record_file(db, file_path, meta)
+
+    def _write_chunks(self, db: _WriterConnection, chunks: List[tuple]) -> None:
+        chunks = [c for c in chunks if c[1] not in self._file_progress.failed]
+        if not chunks:
+            return
+
+        rows = [row for chunk in chunks for row in chunk[3]]
+        try:
+            conn, cursor = db.open()
+            rows = self._encoder.encode(rows)
+            start_time = time.time()
+            # 数据与检查点在同一事务中提交，中断后不会重复或遗漏
+            if self.partitioned:
+                row_nos = [chunk[2] + i for chunk in chunks for i in range(len(chunk[3]))]
+                cursor.executemany(INSERT_PARTITIONED_BOOKS_SQL, [
+                    (row[7], row_no, row[0], row[4] or 0, row[5], row[6])
+                    for row, row_no in zip(rows, row_nos)
+                ])
+                cursor.executemany(INSERT_TEXTS_SQL, [
+                    (row[7], row_no, row[1], row[2], row[3])
+                    for row, row_no in zip(rows, row_nos)
+                ])
+            else:
+                cursor.executemany(INSERT_BOOKS_SQL, rows)
+            cursor.executemany(INSERT_CHECKPOINT_SQL, [
+                (chunk[4], chunk[1], chunk[2], chunk[2] + len(chunk[3])) for chunk in chunks
+            ])
+            conn.commit()
+        except Exception as e:
+            db.rollback()
+            if len(chunks) == 1:
+                file_path = chunks[0][1]
+                logging.error(f"插入批次数据时发生错误 {file_path}: {str(e)}")
+                self._fail(file_path)
+                return
+            # 合并提交失败时逐块重试，只让出错的文件失败
+            for chunk in chunks:
+                self._write_chunks(db, [chunk])
+            return
+        self._governor.record_commit(len(rows), time.time() - start_time)
+
+        with self._summary_lock:
+            self._rows_committed += len(rows)
+            current_time = time.time()
+            if current_time - self._last_log_time >= LOG_INTERVAL:
+                logging.info(f"已写入 {self._rows_committed} 行")
+                self._last_log_time = current_time
+
+        for chunk in chunks:
+            meta = self._file_progress.chunk_committed(chunk[1])
+            if meta:
+                self._record_file(db, chunk[1], meta)
+
+    def _record_file(self, db: _WriterConnection, file_path: str, meta: dict) -> None:
+        """所有数据块提交后记录已处理文件"""
+        try:
+            conn, cursor = db.open()
+            cursor.execute("""
+                INSERT INTO processed_files (file_path, file_hash, last_modified)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    file_hash = VALUES(file_hash),
+                    last_modified = VALUES(last_modified),
+                    processed_at = CURRENT_TIMESTAMP
+            """, (file_path, meta['file_hash'], meta['last_modified']))
+            cursor.execute(
+                "DELETE FROM ingest_checkpoints WHERE file_path = %s AND file_hash = %s",
+                (file_path, meta['file_hash'])
+            )
+            conn.commit()
+        except Exception as e:
+            logging.error(f"记录已处理文件时发生错误 {file_path}: {str(e)}")
+            db.rollback()
+            self._fail(file_path)
+            return
+
+        logging.info(f"完成处理文件 {Path(file_path).name}: 共处理 {meta['total_rows']} 行")
+        self._count('loaded')
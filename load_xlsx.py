@@ -1,14 +1,13 @@
 import os
 import sys
-import hashlib
 import logging
-import pandas as pd
-import numpy as np
 from pathlib import Path
-from datetime import datetime
 from mysql.connector import connect, Error
-from concurrent.futures import ProcessPoolExecutor
 import multiprocessing as mp
+from suggest import rebuild_suggest_terms
+from ingest import (
+    IngestEngine, MAX_PARTITIONED_FILES, create_tables, has_pending_checkpoints, migrate_legacy_books
+)
 
 # 配置日志
 logging.basicConfig(
@@ -26,6 +25,8 @@ class ExcelLoader:
         }
         self.chunk_size = 100000
         self.n_workers = min(42, mp.cpu_count())
+        # 是否创建按源文件分区的books表（最多容纳ingest.MAX_PARTITIONED_FILES个工作簿）
+        self.partitioned = False
 
     def init_database(self):
         """初始化数据库，删除旧表并创建新表"""
@@ -33,41 +34,8 @@ class ExcelLoader:
             conn = connect(**self.db_config)
             cursor = conn.cursor()
 
-            # 删除旧表
-            cursor.execute("DROP TABLE IF EXISTS books")
-            cursor.execute("DROP TABLE IF EXISTS processed_files")
-            
-            # 创建已处理文件记录表
-            cursor.execute("""
-                CREATE TABLE processed_files (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    file_path VARCHAR(512) NOT NULL,
-                    file_hash VARCHAR(64) NOT NULL,
-                    last_modified TIMESTAMP,
-                    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE KEY unique_file_hash (file_hash),
-                    UNIQUE KEY unique_file_path (file_path)
-                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
-            """)
-            
-            # 创建书籍信息表
-            cursor.execute("""
-                CREATE TABLE books (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    file_id VARCHAR(100),
-                    title MEDIUMTEXT,
-                    author MEDIUMTEXT,
-                    publisher MEDIUMTEXT,
-                    language VARCHAR(50),
-                    publish_year INT,
-                    format VARCHAR(50),
-                    source_file VARCHAR(512),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FULLTEXT INDEX idx_title (title),
-                    FULLTEXT INDEX idx_author (author),
-                    FULLTEXT INDEX idx_publisher (publisher)
-                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
-            """)
+            # 删除旧表并重新创建
+            create_tables(cursor, partitioned=self.partitioned)
 
             conn.commit()
             logging.info("数据库表初始化完成")
@@ -79,96 +47,30 @@ class ExcelLoader:
                 cursor.close()
                 conn.close()
 
-    @staticmethod
-    def process_file(args):
-        """处理单个Excel文件"""
-        file_path, db_config = args
+    def migrate(self):
+        """将旧版books表原地迁移为字典编码结构，保留全部数据（数据量大时耗时较长）"""
+        conn = connect(**self.db_config)
         try:
-            # 创建数据库连接
-            conn = connect(**db_config)
-            cursor = conn.cursor()
-
-            # 计算文件哈希值
-            hash_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            file_hash = hash_md5.hexdigest()
-
-            # 读取Excel文件
-            df = pd.read_excel(
-                file_path,
-                dtype={
-                    '文件编号': str,
-                    '书名': str,
-                    '作者': str,
-                    '出版社': str,
-                    '语种': str,
-                    '出版年份': 'Int64',
-                    '文件格式': str
-                }
-            )
-            df['源文件'] = Path(file_path).name
-            
-            # 替换所有的NaN值为None
-            df = df.replace({np.nan: None})
-
-            # 分批处理数据
-            batch_size = 5000
-            total_rows = len(df)
-            processed_rows = 0
-
-            while processed_rows < total_rows:
-                batch_df = df.iloc[processed_rows:processed_rows + batch_size]
-                values = []
-                
-                for _, row in batch_df.iterrows():
-                    values.append((
-                        str(row.get('文件编号'))[:100] if pd.notna(row.get('文件编号')) else None,
-                        str(row.get('书名')) if pd.notna(row.get('书名')) else None,
-                        str(row.get('作者')) if pd.notna(row.get('作者')) else None,
-                        str(row.get('出版社')) if pd.notna(row.get('出版社')) else None,
-                        str(row.get('语种'))[:50] if pd.notna(row.get('语种')) else None,
-                        int(row.get('出版年份')) if pd.notna(row.get('出版年份')) else None,
-                        str(row.get('文件格式'))[:50] if pd.notna(row.get('文件格式')) else None,
-                        str(row.get('源文件'))[:512] if pd.notna(row.get('源文件')) else None
-                    ))
-
-                cursor.executemany("""
-                    INSERT INTO books (
-                        file_id, title, author, publisher, 
-                        language, publish_year, format, source_file
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, values)
-                conn.commit()
-
-                processed_rows += len(batch_df)
-                logging.info(f"文件 {Path(file_path).name}: 已处理 {processed_rows}/{total_rows} 行 ({processed_rows/total_rows*100:.1f}%)")
-
-            # 记录已处理文件
-            cursor.execute("""
-                INSERT INTO processed_files (file_path, file_hash, last_modified)
-                VALUES (%s, %s, %s)
-            """, (str(file_path), file_hash, datetime.fromtimestamp(os.path.getmtime(file_path))))
-            conn.commit()
+            migrate_legacy_books(conn)
+        finally:
+            conn.close()
 
-            logging.info(f"完成处理文件 {Path(file_path).name}: 共处理 {total_rows} 行")
-            return True
-        except Exception as e:
-            logging.error(f"处理文件时发生错误 {file_path}: {str(e)}")
-            if 'conn' in locals() and conn.is_connected():
-                conn.rollback()
-            return False
+    def has_interrupted_load(self) -> bool:
+        """检查上次导入是否中断（存在未完成文件的检查点）"""
+        conn = connect(**self.db_config)
+        try:
+            return has_pending_checkpoints(conn)
         finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
+            conn.close()
 
-    def load_data(self, directory: str):
-        """加载所有Excel文件到数据库"""
+    def load_data(self, directory: str, resume: bool = True):
+        """加载所有Excel文件到数据库，上次导入中断时默认从检查点继续"""
         try:
-            # 初始化数据库（删除旧数据）
-            self.init_database()
+            if resume and self.has_interrupted_load():
+                logging.info("检测到未完成的导入，从检查点继续")
+            else:
+                # 初始化数据库（删除旧数据）
+                self.init_database()
 
             # 查找所有Excel文件
             excel_files = []
@@ -180,31 +82,43 @@ class ExcelLoader:
 
             logging.info(f"找到 {len(excel_files)} 个Excel文件，开始加载...")
 
-            # 使用进程池处理文件
-            with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
-                args = [(str(f), self.db_config) for f in excel_files]
-                results = list(executor.map(self.process_file, args))
+            # 解析进程与写入线程组成流水线导入
+            engine = IngestEngine(self.db_config, n_parsers=self.n_workers)
+            summary = engine.run(excel_files)
 
             # 统计处理结果
-            success_count = sum(1 for r in results if r)
-            logging.info(f"数据加载完成！成功处理 {success_count}/{len(excel_files)} 个文件")
+            logging.info(f"数据加载完成！成功处理 {summary['loaded']}/{len(excel_files)} 个文件")
+
+            # 重建联想索引
+            rebuild_suggest_terms(self.db_config)
 
         except Exception as e:
             logging.error(f"加载数据时发生错误: {str(e)}")
             raise
 
 def main():
-    if len(sys.argv) != 2:
-        print("使用方法: python load_xlsx.py <xlsx目录路径>")
+    loader = ExcelLoader()
+    if sys.argv[1:] == ['--migrate']:
+        loader.migrate()
+        return
+
+    args = [arg for arg in sys.argv[1:] if arg not in ('--restart', '--partitioned')]
+    if len(args) != 1:
+        print("使用方法: python load_xlsx.py [--restart] [--partitioned] <xlsx目录路径>")
+        print("          python load_xlsx.py --migrate")
+        print("  --restart      忽略上次中断的导入，清空数据后重新开始")
+        print("  --partitioned  重新建表时使用按源文件分区的布局")
+        print(f"                 （每个工作簿一个分区，受MySQL分区数限制最多 {MAX_PARTITIONED_FILES} 个工作簿）")
+        print("  --migrate      将旧版books表原地迁移为当前结构，保留已有数据（不导入文件）")
         sys.exit(1)
 
-    directory = sys.argv[1]
+    directory = args[0]
     if not os.path.isdir(directory):
         print(f"错误: '{directory}' 不是有效的目录")
         sys.exit(1)
 
-    loader = ExcelLoader()
-    loader.load_data(directory)
+    loader.partitioned = '--partitioned' in sys.argv
+    loader.load_data(directory, resume='--restart' not in sys.argv)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
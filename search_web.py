@@ -1,16 +1,36 @@
-from flask import Flask, render_template, jsonify, request, session, json
-from book_search import BookSearcher
+from flask import Flask, render_template, jsonify, request, session, json, Response, send_file, stream_with_context
+from book_search import BookSearcher, QueryCancelledError, QueryTimeoutError, QUERY_ID_PATTERN, parse_lookup_values
+from book_export import EXPORT_FORMATS, iter_csv, write_xlsx
+from suggest import SUGGEST_FIELDS
 from translations import TRANSLATIONS
 import os
+import gzip
 import time
+import hashlib
 import secrets
+import tempfile
 import logging
 from threading import Lock
 from pathlib import Path
 
+try:
+    import brotli  # 可选依赖，未安装时只使用gzip
+except ImportError:
+    brotli = None
+
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
+# 响应体超过该大小（字节）时才压缩
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/css', 'text/javascript', 'application/javascript'}
+# 数据集版本的缓存时间（秒），避免每个请求都查询数据库
+DATASET_VERSION_TTL = 5
+
+_dataset_version = {'value': None, 'checked_at': 0.0}
+_statistics_cache = {'version': None, 'stats': None}
+cache_lock = Lock()
+
 # Global dictionary to store user-specific searchers
 user_searchers = {}
 searcher_lock = Lock()
@@ -27,6 +47,88 @@ def get_user_searcher():
             user_searchers[user_id] = BookSearcher()
         return user_searchers[user_id]
 
+def get_dataset_version(searcher):
+    """获取数据集版本，短时间内复用上一次的查询结果"""
+    with cache_lock:
+        now = time.time()
+        if _dataset_version['value'] is None or now - _dataset_version['checked_at'] >= DATASET_VERSION_TTL:
+            _dataset_version['value'] = searcher.get_dataset_version()
+            _dataset_version['checked_at'] = now
+        return _dataset_version['value']
+
+def make_etag(*parts):
+    """由数据集版本和规范化后的查询条件生成ETag"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def not_modified(etag):
+    """客户端缓存仍然有效时返回304响应，否则返回None"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def with_etag(response, etag):
+    """为响应设置ETag，并要求客户端每次使用前重新验证"""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.after_request
+def compress_response(response):
+    """对较大的文本响应（包括静态JS/CSS文件）进行brotli或gzip压缩"""
+    if (response.status_code == 200
+            and response.direct_passthrough
+            and request.endpoint == 'static'
+            and response.mimetype in COMPRESSIBLE_MIMETYPES):
+        # 静态文件默认以文件对象直接透传，读入内存后才能压缩
+        response.direct_passthrough = False
+
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        response.set_data(brotli.compress(data, quality=4))
+        response.headers['Content-Encoding'] = 'br'
+    elif accept['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    # 压缩后的内容与原文件字节不同，文件的强ETag改为弱ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def extract_search_params(data):
+    """从请求数据中提取搜索参数"""
+    search_params = {
+        'file_id': data.get('file_id'),
+        'title': data.get('title'),
+        'author': data.get('author'),
+        'publisher': data.get('publisher'),
+        'year': data.get('year'),
+        'language': data.get('language'),
+        'format': data.get('format'),
+        'source_file': data.get('source_file')
+    }
+    
+    # 移除空值
+    return {k: v for k, v in search_params.items() if v not in (None, '')}
+
 @app.route('/')
 def index():
     """Render the main search page"""
@@ -86,6 +188,11 @@ def load_data():
             'message': str(e)
         }), 500
 
+# 分页搜索时每页的最大行数
+MAX_PAGE_SIZE = 1000
+# 单次搜索的时限（秒）
+QUERY_TIMEOUT = float(os.environ.get('BOOK_SEARCH_QUERY_TIMEOUT', 10))
+
 @app.route('/api/search', methods=['POST'])
 def search():
     """Search for books based on provided criteria"""
@@ -96,26 +203,62 @@ def search():
         searcher = get_user_searcher()
         
         # 构建搜索参数
-        search_params = {
-            'title': data.get('title'),
-            'author': data.get('author'),
-            'publisher': data.get('publisher'),
-            'year': data.get('year'),
-            'language': data.get('language'),
-            'format': data.get('format')
-        }
+        search_params = extract_search_params(data)
+        
+        # 数据集未变且查询条件相同时直接返回304
+        limit = offset = None
+        if data.get('limit') is not None:
+            limit = min(int(data['limit']), MAX_PAGE_SIZE)
+            offset = max(int(data.get('offset') or 0), 0)
+            if limit < 1:
+                return jsonify({'status': 'error', 'message': f'Invalid limit: {limit}'}), 400
+        normalized = {k: str(v).strip() for k, v in search_params.items()}
+        etag = make_etag(get_dataset_version(searcher), 'search', normalized, limit, offset)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        # 移除None值
-        search_params = {k: v for k, v in search_params.items() if v is not None}
+        # 查询编号用于客户端离开或发起新搜索时取消查询
+        query_id = request.headers.get('X-Query-Id')
+        if query_id and not QUERY_ID_PATTERN.match(query_id):
+            return jsonify({'status': 'error', 'message': 'Invalid X-Query-Id'}), 400
+        guard = {'timeout': QUERY_TIMEOUT, 'query_id': query_id}
+        
+        # 分页模式：前端按需拉取可见区域附近的结果页
+        # 总数由/api/search/count单独统计，首页不必等待全量计数
+        if limit is not None:
+            results = searcher.search_books(limit=limit, offset=offset, **guard, **search_params)
+            
+            return with_etag(jsonify({
+                'status': 'success',
+                'data': results,
+                'count': None,
+                'offset': offset
+            }), etag)
         
         # 执行搜索
-        results = searcher.search_books(**search_params)
+        results = searcher.search_books(**guard, **search_params)
         
-        return jsonify({
+        return with_etag(jsonify({
             'status': 'success',
             'data': results,
             'count': len(results)
-        })
+        }), etag)
+    except QueryTimeoutError as e:
+        logging.warning(f"Search timed out: {str(e)}")
+        lang = session.get('lang', 'zh')
+        return jsonify({
+            'status': 'error',
+            'code': 'query_too_broad',
+            'message': TRANSLATIONS.get(lang, TRANSLATIONS['zh'])['query_too_broad']
+        }), 422
+    except QueryCancelledError as e:
+        logging.info(f"Search cancelled: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'code': 'cancelled',
+            'message': str(e)
+        }), 409
     except Exception as e:
         logging.error(f"Search error: {str(e)}")
         return jsonify({
@@ -123,6 +266,212 @@ def search():
             'message': str(e)
         }), 500
 
+@app.route('/api/search/count', methods=['POST'])
+def search_count():
+    """Count all matches for the search criteria (requested after the first page is shown)"""
+    try:
+        data = request.get_json()
+        searcher = get_user_searcher()
+        search_params = extract_search_params(data)
+        
+        normalized = {k: str(v).strip() for k, v in search_params.items()}
+        etag = make_etag(get_dataset_version(searcher), 'count', normalized)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        query_id = request.headers.get('X-Query-Id')
+        if query_id and not QUERY_ID_PATTERN.match(query_id):
+            return jsonify({'status': 'error', 'message': 'Invalid X-Query-Id'}), 400
+        guard = {'timeout': QUERY_TIMEOUT, 'query_id': query_id}
+        count = searcher.count_books(**guard, **search_params)
+        
+        return with_etag(jsonify({
+            'status': 'success',
+            'count': count
+        }), etag)
+    except QueryTimeoutError as e:
+        logging.warning(f"Count timed out: {str(e)}")
+        lang = session.get('lang', 'zh')
+        return jsonify({
+            'status': 'error',
+            'code': 'query_too_broad',
+            'message': TRANSLATIONS.get(lang, TRANSLATIONS['zh'])['query_too_broad']
+        }), 422
+    except QueryCancelledError as e:
+        logging.info(f"Count cancelled: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'code': 'cancelled',
+            'message': str(e)
+        }), 409
+    except Exception as e:
+        logging.error(f"Count error: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/search/cancel', methods=['POST'])
+def cancel_search():
+    """Cancel running searches by query id (sent when the client navigates away)"""
+    try:
+        # navigator.sendBeacon发送的请求不一定带有JSON的Content-Type
+        data = request.get_json(force=True, silent=True) or {}
+        query_ids = data.get('query_ids', []) if isinstance(data, dict) else None
+        if not isinstance(query_ids, list) or not all(
+                isinstance(query_id, str) and QUERY_ID_PATTERN.match(query_id) for query_id in query_ids):
+            return jsonify({'status': 'error', 'message': 'Invalid query_ids'}), 400
+        
+        searcher = get_user_searcher()
+        cancelled = sum(searcher.cancel_query(query_id) for query_id in query_ids)
+        
+        return jsonify({
+            'status': 'success',
+            'cancelled': cancelled
+        })
+    except Exception as e:
+        logging.error(f"Cancel error: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/stats', methods=['GET'])
+def statistics():
+    """Return dataset statistics, cached per dataset version"""
+    try:
+        searcher = get_user_searcher()
+        version = get_dataset_version(searcher)
+        etag = make_etag(version, 'stats')
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        # 同一数据集版本的统计结果在进程内复用
+        with cache_lock:
+            stats = _statistics_cache['stats'] if _statistics_cache['version'] == version else None
+        if stats is None:
+            stats = searcher.get_statistics()
+            if stats:
+                with cache_lock:
+                    _statistics_cache.update(version=version, stats=stats)
+
+        return with_etag(jsonify({
+            'status': 'success',
+            'data': stats
+        }), etag)
+    except Exception as e:
+        logging.error(f"Statistics error: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    """Return typeahead suggestions for a title, author or publisher prefix"""
+    try:
+        field = request.args.get('field', 'title')
+        prefix = request.args.get('q', '')
+        limit = request.args.get('limit', 10, type=int)
+        if field not in SUGGEST_FIELDS:
+            return jsonify({'status': 'error', 'message': f'Invalid field: {field}'}), 400
+
+        searcher = get_user_searcher()
+        suggestions = searcher.suggest(field, prefix, limit)
+
+        return jsonify({
+            'status': 'success',
+            'data': suggestions
+        })
+    except Exception as e:
+        logging.error(f"Suggest error: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+# 单次批量查询允许的最大输入数
+MAX_BATCH_VALUES = 100000
+
+@app.route('/api/batch', methods=['POST'])
+def batch_lookup():
+    """Resolve a list of file IDs or titles (JSON array or uploaded file) in one request"""
+    try:
+        if 'file' in request.files:
+            # 上传文本文件，每行一个值
+            field = request.form.get('field', 'file_id')
+            content = request.files['file'].read().decode('utf-8-sig')
+            values = parse_lookup_values(content.splitlines())
+        else:
+            data = request.get_json() or {}
+            field = data.get('field', 'file_id')
+            values = parse_lookup_values(data.get('values') or [])
+
+        if field not in ('file_id', 'title'):
+            return jsonify({'status': 'error', 'message': f'Invalid field: {field}'}), 400
+        if len(values) > MAX_BATCH_VALUES:
+            return jsonify({
+                'status': 'error',
+                'message': f'Too many values: {len(values)} > {MAX_BATCH_VALUES}'
+            }), 400
+
+        searcher = get_user_searcher()
+        result = searcher.batch_lookup(values, field=field)
+
+        return jsonify({
+            'status': 'success',
+            'data': result,
+            'matched': len(result['matches']),
+            'missed': len(result['misses'])
+        })
+    except Exception as e:
+        logging.error(f"Batch lookup error: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/export', methods=['GET'])
+def export():
+    """Stream search results as a CSV or XLSX download"""
+    try:
+        fmt = request.args.get('export_format', 'csv').lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'status': 'error', 'message': f'Invalid export format: {fmt}'}), 400
+
+        searcher = get_user_searcher()
+        search_params = extract_search_params(request.args)
+        filename = f"search_results_{time.strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+        if fmt == 'csv':
+            # CSV边读边发，不在内存中保留全部结果
+            rows = searcher.iter_books(**search_params)
+            return Response(
+                stream_with_context(chunk.encode('utf-8') for chunk in iter_csv(rows)),
+                mimetype='text/csv; charset=utf-8',
+                headers={'Content-Disposition': f'attachment; filename={filename}'}
+            )
+
+        # XLSX是zip容器，无法边写边发；以只写模式落到临时文件后再发送
+        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            write_xlsx(searcher.iter_books(**search_params), tmp_path)
+            response = send_file(tmp_path, as_attachment=True, download_name=filename)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        response.call_on_close(lambda: os.remove(tmp_path))
+        return response
+    except Exception as e:
+        logging.error(f"Export error: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     app.run(host='0.0.0.0', port=6122, debug=True)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""生产环境启动入口
+
+使用gunicorn预先在主进程中加载应用（preload_app），再fork出多个工作进程，
+各工作进程共享已加载的代码页（写时复制），启动快且总内存占用低。
+同时保证所有工作进程使用同一个session密钥。
+"""
+
+import argparse
+import logging
+import multiprocessing as mp
+
+from gunicorn.app.base import BaseApplication
+
+
+class SearchServer(BaseApplication):
+    """以预加载方式运行search_web应用的gunicorn服务"""
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from search_web import app
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以多进程方式启动图书搜索服务')
+    parser.add_argument('--bind', default='0.0.0.0:6122', help='监听地址（默认为0.0.0.0:6122）')
+    parser.add_argument('--workers', '-w', type=int, default=mp.cpu_count() * 2 + 1, help='工作进程数')
+    parser.add_argument('--threads', type=int, default=4, help='每个工作进程的线程数')
+    parser.add_argument('--timeout', type=int, default=120, help='工作进程超时时间（秒）')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    SearchServer({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'preload_app': True,
+        'worker_class': 'gthread',
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const searchForm = document.getElementById('searchForm');
     const loadDataBtn = document.getElementById('loadDataBtn');
     const clearBtn = document.getElementById('clearBtn');
+    const exportCsvBtn = document.getElementById('exportCsvBtn');
+    const exportXlsxBtn = document.getElementById('exportXlsxBtn');
     const loading = document.getElementById('loading');
     const resultsStats = document.getElementById('resultsStats');
     const resultsBody = document.getElementById('resultsBody');
@@ -62,32 +64,324 @@ document.addEventListener('DOMContentLoaded', function() {
         }).showToast();
     }
 
-    function displayResults(results, count) {
-        resultsBody.innerHTML = '';
-        if (results.length === 0) {
+    // 虚拟滚动：只渲染可见区域附近的行，结果页按需从服务端拉取
+    const resultsViewport = document.getElementById('resultsViewport');
+    const PAGE_SIZE = 200;
+    const OVERSCAN_ROWS = 20;
+    const RESULT_FIELDS = ['file_id', 'title', 'author', 'publisher', 'language', 'publish_year', 'format'];
+
+    const resultState = {
+        generation: 0,      // 每次新搜索递增，丢弃旧搜索的迟到响应
+        params: {},
+        total: 0,
+        countState: 'pending',  // 总数：pending 统计中 / done 已知 / failed 统计失败
+        rowHeight: 0,
+        pages: new Map(),   // 页号 -> 结果数组
+        pending: new Set(), // 正在请求的页号
+        frameRequested: false
+    };
+
+    function resetResults() {
+        cancelInflightQueries();
+        resultState.generation++;
+        resultState.params = {};
+        resultState.total = 0;
+        resultState.countState = 'pending';
+        resultState.pages.clear();
+        resultState.pending.clear();
+        resultsBody.replaceChildren();
+        resultsStats.textContent = '';
+        resultsTable.style.display = 'none';
+    }
+
+    // 浏览器不会缓存POST响应，由前端保存ETag和结果，发送条件请求复用未变化的页面
+    const MAX_CACHED_RESPONSES = 100;
+    const responseCache = new Map();  // 请求体 -> {etag, data}
+
+    async function conditionalPost(url, body, queryId, signal) {
+        const key = `${url} ${body}`;
+        const cached = responseCache.get(key);
+        const headers = {'Content-Type': 'application/json', 'X-Query-Id': queryId};
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+
+        const response = await fetch(url, {method: 'POST', headers: headers, body: body, signal: signal});
+        if (response.status === 304 && cached) {
+            // 重新插入以维持最近使用的顺序
+            responseCache.delete(key);
+            responseCache.set(key, cached);
+            return cached.data;
+        }
+
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (etag && data.status === 'success') {
+            responseCache.delete(key);
+            responseCache.set(key, {etag: etag, data: data});
+            if (responseCache.size > MAX_CACHED_RESPONSES) {
+                responseCache.delete(responseCache.keys().next().value);
+            }
+        }
+        return data;
+    }
+
+    // 进行中的搜索请求：查询编号 -> AbortController
+    const inflightQueries = new Map();
+
+    function newQueryId() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    // 中止进行中的请求，并通知服务端终止对应的数据库查询
+    function cancelInflightQueries() {
+        if (inflightQueries.size === 0) return;
+        const queryIds = Array.from(inflightQueries.keys());
+        inflightQueries.forEach(controller => controller.abort());
+        inflightQueries.clear();
+
+        const payload = JSON.stringify({query_ids: queryIds});
+        if (navigator.sendBeacon) {
+            navigator.sendBeacon('/api/search/cancel', new Blob([payload], {type: 'application/json'}));
+        } else {
+            fetch('/api/search/cancel', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: payload,
+                keepalive: true
+            });
+        }
+    }
+
+    // 页面关闭或跳转时取消尚未完成的搜索
+    window.addEventListener('pagehide', cancelInflightQueries);
+
+    async function fetchPage(pageIndex) {
+        if (resultState.pages.has(pageIndex) || resultState.pending.has(pageIndex)) return;
+        const generation = resultState.generation;
+        const queryId = newQueryId();
+        const controller = new AbortController();
+        resultState.pending.add(pageIndex);
+        inflightQueries.set(queryId, controller);
+
+        try {
+            const body = JSON.stringify({
+                ...resultState.params,
+                offset: pageIndex * PAGE_SIZE,
+                limit: PAGE_SIZE
+            });
+            const data = await conditionalPost('/api/search', body, queryId, controller.signal);
+            if (generation !== resultState.generation) return;
+
+            if (data.status !== 'success') {
+                if (data.code !== 'cancelled') {
+                    showToast(data.message, true);
+                }
+                return;
+            }
+            resultState.pages.set(pageIndex, data.data);
+            if (resultState.countState !== 'done') {
+                // 总数未知时先按已加载的行数显示；不满一页说明已到末尾，总数即可确定
+                resultState.total = Math.max(resultState.total, pageIndex * PAGE_SIZE + data.data.length);
+                if (data.data.length < PAGE_SIZE) {
+                    resultState.countState = 'done';
+                }
+            }
+            scheduleRender();
+        } catch (error) {
+            if (error.name !== 'AbortError') throw error;
+        } finally {
+            inflightQueries.delete(queryId);
+            if (generation === resultState.generation) {
+                resultState.pending.delete(pageIndex);
+            }
+        }
+    }
+
+    // 第一页显示之后再单独统计总数，统计结果不影响首屏时间
+    async function fetchCount() {
+        const generation = resultState.generation;
+        const queryId = newQueryId();
+        const controller = new AbortController();
+        inflightQueries.set(queryId, controller);
+
+        try {
+            const body = JSON.stringify(resultState.params);
+            const data = await conditionalPost('/api/search/count', body, queryId, controller.signal);
+            if (generation !== resultState.generation || resultState.countState === 'done') return;
+
+            if (data.status !== 'success') {
+                if (data.code !== 'cancelled') {
+                    resultState.countState = 'failed';
+                    scheduleRender();
+                }
+                return;
+            }
+            resultState.total = data.count;
+            resultState.countState = 'done';
+            scheduleRender();
+        } catch (error) {
+            if (error.name !== 'AbortError') throw error;
+        } finally {
+            inflightQueries.delete(queryId);
+        }
+    }
+
+    function getRow(index) {
+        const page = resultState.pages.get(Math.floor(index / PAGE_SIZE));
+        return page ? page[index % PAGE_SIZE] : null;
+    }
+
+    function createSpacer(height) {
+        const row = document.createElement('tr');
+        const cell = document.createElement('td');
+        cell.colSpan = RESULT_FIELDS.length;
+        cell.style.height = `${height}px`;
+        cell.style.padding = '0';
+        cell.style.border = '0';
+        row.appendChild(cell);
+        return row;
+    }
+
+    function createRow(book) {
+        const row = document.createElement('tr');
+        RESULT_FIELDS.forEach(field => {
+            const cell = document.createElement('td');
+            // textContent 保证内容被转义
+            cell.textContent = book ? (book[field] ?? '') : '…';
+            row.appendChild(cell);
+        });
+        return row;
+    }
+
+    function scheduleRender() {
+        if (resultState.frameRequested) return;
+        resultState.frameRequested = true;
+        requestAnimationFrame(() => {
+            resultState.frameRequested = false;
+            renderVisibleRows();
+        });
+    }
+
+    function renderVisibleRows() {
+        const total = resultState.total;
+        if (total === 0) {
             resultsStats.textContent = '未找到匹配的结果';
             resultsTable.style.display = 'none';
             return;
         }
 
-        resultsStats.textContent = `共找到 ${count} 条结果`;
+        if (resultState.countState === 'done') {
+            resultsStats.textContent = `共找到 ${total} 条结果`;
+        } else if (resultState.countState === 'failed') {
+            resultsStats.textContent = `至少找到 ${total} 条结果`;
+        } else {
+            resultsStats.textContent = `已找到 ${total} 条结果，正在统计总数…`;
+        }
         resultsTable.style.display = 'table';
-        
-        results.forEach(book => {
-            const row = document.createElement('tr');
-            row.innerHTML = `
-                <td>${book.file_id || ''}</td>
-                <td>${book.title || ''}</td>
-                <td>${book.author || ''}</td>
-                <td>${book.publisher || ''}</td>
-                <td>${book.language || ''}</td>
-                <td>${book.publish_year || ''}</td>
-                <td>${book.format || ''}</td>
-            `;
-            resultsBody.appendChild(row);
+
+        // 首次渲染时测量实际行高
+        if (!resultState.rowHeight) {
+            const probe = createRow(getRow(0));
+            resultsBody.replaceChildren(probe);
+            resultState.rowHeight = probe.getBoundingClientRect().height || 37;
+        }
+
+        // 总数未知时已加载的页都是满页，在末尾预留一页占位行，滚动到此处时拉取下一页；
+        // 总数统计超时或失败时仍可继续向下浏览
+        const rowCount = resultState.countState === 'done' ? total : total + PAGE_SIZE;
+        const rowHeight = resultState.rowHeight;
+        const visibleRows = Math.ceil(resultsViewport.clientHeight / rowHeight);
+        const first = Math.max(0, Math.floor(resultsViewport.scrollTop / rowHeight) - OVERSCAN_ROWS);
+        const last = Math.min(rowCount, first + visibleRows + OVERSCAN_ROWS * 2);
+
+        // 拉取可见区域涉及但尚未加载的页
+        for (let page = Math.floor(first / PAGE_SIZE); page <= Math.floor((last - 1) / PAGE_SIZE); page++) {
+            fetchPage(page).catch(error => {
+                console.error('Search error:', error);
+                showToast(`Error: ${error.message}`, true);
+            });
+        }
+
+        // 一次性替换tbody内容，避免逐行插入引起的多次重排
+        const fragment = document.createDocumentFragment();
+        fragment.appendChild(createSpacer(first * rowHeight));
+        for (let i = first; i < last; i++) {
+            fragment.appendChild(createRow(getRow(i)));
+        }
+        fragment.appendChild(createSpacer((rowCount - last) * rowHeight));
+        resultsBody.replaceChildren(fragment);
+    }
+
+    if (resultsViewport) {
+        resultsViewport.addEventListener('scroll', scheduleRender, {passive: true});
+    }
+
+    function getSearchParams() {
+        const formData = new FormData(searchForm);
+        const searchParams = {};
+        for (let [key, value] of formData.entries()) {
+            if (value.trim()) {
+                searchParams[key] = value.trim();
+            }
+        }
+        return searchParams;
+    }
+
+    // 导出由服务端流式生成，浏览器直接下载
+    function exportResults(format) {
+        const params = new URLSearchParams(getSearchParams());
+        params.set('export_format', format);
+        window.location.href = `/api/export?${params.toString()}`;
+    }
+
+    // 输入联想：防抖后请求服务端前缀索引，新请求会取消尚未返回的旧请求
+    const SUGGEST_DEBOUNCE_MS = 200;
+
+    function setupSuggest(input) {
+        const field = input.dataset.suggest;
+        const datalist = document.getElementById(input.getAttribute('list'));
+        let timer = null;
+        let controller = null;
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            const prefix = input.value.trim();
+            if (!prefix) {
+                datalist.innerHTML = '';
+                return;
+            }
+
+            timer = setTimeout(async function() {
+                if (controller) controller.abort();
+                controller = new AbortController();
+                try {
+                    const params = new URLSearchParams({field: field, q: prefix});
+                    const response = await fetch(`/api/suggest?${params.toString()}`, {
+                        signal: controller.signal
+                    });
+                    const data = await response.json();
+                    if (data.status !== 'success') return;
+
+                    const fragment = document.createDocumentFragment();
+                    data.data.forEach(item => {
+                        const option = document.createElement('option');
+                        option.value = item.term;
+                        fragment.appendChild(option);
+                    });
+                    datalist.replaceChildren(fragment);
+                } catch (error) {
+                    if (error.name !== 'AbortError') {
+                        console.error('Suggest error:', error);
+                    }
+                }
+            }, SUGGEST_DEBOUNCE_MS);
         });
     }
 
+    document.querySelectorAll('input[data-suggest]').forEach(setupSuggest);
+
     // 搜索表单提交事件
     if (searchForm) {
         searchForm.addEventListener('submit', async function(e) {
@@ -95,27 +389,17 @@ document.addEventListener('DOMContentLoaded', function() {
             showLoading();
 
             try {
-                const formData = new FormData(searchForm);
-                const searchParams = {};
-                for (let [key, value] of formData.entries()) {
-                    if (value.trim()) {
-                        searchParams[key] = value.trim();
-                    }
-                }
+                const searchParams = getSearchParams();
 
-                const response = await fetch('/api/search', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(searchParams)
-                });
-
-                const data = await response.json();
-                if (data.status === 'success') {
-                    displayResults(data.data, data.count);
-                } else {
-                    showToast(data.message, true);
+                resetResults();
+                resultState.params = searchParams;
+                resultsViewport.scrollTop = 0;
+
+                // 只请求第一页，其余页面在滚动时按需加载
+                await fetchPage(0);
+                renderVisibleRows();
+                if (resultState.countState === 'pending' && resultState.pages.has(0)) {
+                    fetchCount().catch(error => console.error('Count error:', error));
                 }
             } catch (error) {
                 console.error('Search error:', error);
@@ -126,6 +410,14 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // 导出按钮点击事件
+    if (exportCsvBtn) {
+        exportCsvBtn.addEventListener('click', () => exportResults('csv'));
+    }
+    if (exportXlsxBtn) {
+        exportXlsxBtn.addEventListener('click', () => exportResults('xlsx'));
+    }
+
     // 加载数据按钮点击事件
     if (loadDataBtn) {
         loadDataBtn.addEventListener('click', loadData);
@@ -135,9 +427,7 @@ document.addEventListener('DOMContentLoaded', function() {
     if (clearBtn) {
         clearBtn.addEventListener('click', function() {
             searchForm.reset();
-            resultsBody.innerHTML = '';
-            resultsStats.textContent = '';
-            resultsTable.style.display = 'none';
+            resetResults();
         });
     }
 
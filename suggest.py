@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""书名、作者、出版社的前缀联想
+
+数据加载完成后由 rebuild_suggest_terms 将去重后的词条及其出现次数写入
+suggest_terms 表，并为短前缀预先计算热门候选写入 suggest_prefixes 表。
+查询进程不在内存中保留词条：短前缀按主键直接读取预先排好的候选，
+较长的前缀匹配的词条很少，在 suggest_terms 的主键上做范围查询。
+"""
+
+import logging
+from typing import List, Dict, Any
+
+import mysql.connector
+from mysql.connector import Error
+
+SUGGEST_FIELDS = ('title', 'author', 'publisher')
+MAX_TERM_LENGTH = 255
+MAX_SUGGESTIONS = 10
+# 不超过该长度的前缀预先计算热门候选，避免在大区间上排序
+PRECOMPUTED_PREFIX_LENGTH = 4
+# 写入前缀候选表时每次提交的行数
+PREFIX_INSERT_BATCH = 5000
+
+# MySQL错误码：表不存在（尚未建立联想词条）
+ER_NO_SUCH_TABLE = 1146
+
+INSERT_PREFIX_SQL = """
+    INSERT INTO suggest_prefixes_new (field, prefix, rank_no, term, popularity)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+
+def rebuild_suggest_terms(db_config: dict) -> None:
+    """根据books表重建联想词条表和前缀候选表，新表建好后原子替换旧表"""
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    try:
+        # 分区布局下文本列位于book_texts表
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM information_schema.tables
+            WHERE table_schema = %s AND table_name = 'book_texts'
+        """, (db_config['database'],))
+        source_table = 'book_texts' if cursor.fetchone()[0] else 'books'
+
+        cursor.execute("DROP TABLE IF EXISTS suggest_terms_new")
+        cursor.execute(f"""
+            CREATE TABLE suggest_terms_new (
+                field VARCHAR(16) NOT NULL,
+                term VARCHAR({MAX_TERM_LENGTH}) NOT NULL,
+                popularity INT NOT NULL,
+                PRIMARY KEY (field, term)
+            ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+        """)
+        for field in SUGGEST_FIELDS:
+            cursor.execute(f"""
+                INSERT IGNORE INTO suggest_terms_new (field, term, popularity)
+                SELECT %s, LEFT(TRIM({field}), {MAX_TERM_LENGTH}) AS term, COUNT(*)
+                FROM {source_table}
+                WHERE {field} IS NOT NULL AND TRIM({field}) <> ''
+                GROUP BY term
+            """, (field,))
+        conn.commit()
+
+        # 前缀为casefold后的小写形式，按二进制比较，与查询时的处理方式一致
+        cursor.execute("DROP TABLE IF EXISTS suggest_prefixes_new")
+        cursor.execute(f"""
+            CREATE TABLE suggest_prefixes_new (
+                field VARCHAR(16) NOT NULL,
+                prefix VARCHAR({PRECOMPUTED_PREFIX_LENGTH}) COLLATE utf8mb4_bin NOT NULL,
+                rank_no TINYINT UNSIGNED NOT NULL,
+                term VARCHAR({MAX_TERM_LENGTH}) NOT NULL,
+                popularity INT NOT NULL,
+                PRIMARY KEY (field, prefix, rank_no)
+            ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+        """)
+        _build_prefixes(db_config, conn, cursor)
+
+        cursor.execute("CREATE TABLE IF NOT EXISTS suggest_terms LIKE suggest_terms_new")
+        cursor.execute("CREATE TABLE IF NOT EXISTS suggest_prefixes LIKE suggest_prefixes_new")
+        cursor.execute("""
+            RENAME TABLE suggest_terms TO suggest_terms_old,
+                         suggest_terms_new TO suggest_terms,
+                         suggest_prefixes TO suggest_prefixes_old,
+                         suggest_prefixes_new TO suggest_prefixes
+        """)
+        cursor.execute("DROP TABLE suggest_terms_old")
+        cursor.execute("DROP TABLE suggest_prefixes_old")
+        logging.info("联想词条表重建完成")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _build_prefixes(db_config: dict, conn, cursor) -> None:
+    """按热度从高到低遍历词条，为每个短前缀保留前若干个候选
+
+    词条通过独立连接的非缓冲游标逐行读取，内存中只保存各前缀已有的候选数。
+    """
+    read_conn = mysql.connector.connect(**db_config)
+    read_cursor = read_conn.cursor(buffered=False)
+    try:
+        for field in SUGGEST_FIELDS:
+            counts = {}
+            rows = []
+            read_cursor.execute("""
+                SELECT term, popularity
+                FROM suggest_terms_new
+                WHERE field = %s
+                ORDER BY popularity DESC, term
+            """, (field,))
+            for term, popularity in read_cursor:
+                key = term.casefold()
+                for length in range(1, min(len(key), PRECOMPUTED_PREFIX_LENGTH) + 1):
+                    prefix = key[:length]
+                    # 查询时前缀会去除首尾空白，以空白结尾的前缀不会被查询
+                    if prefix[-1].isspace():
+                        continue
+                    rank = counts.get(prefix, 0)
+                    if rank < MAX_SUGGESTIONS:
+                        counts[prefix] = rank + 1
+                        rows.append((field, prefix, rank, term, popularity))
+                if len(rows) >= PREFIX_INSERT_BATCH:
+                    cursor.executemany(INSERT_PREFIX_SQL, rows)
+                    conn.commit()
+                    rows = []
+            if rows:
+                cursor.executemany(INSERT_PREFIX_SQL, rows)
+                conn.commit()
+            logging.info(f"已生成 {field} 联想前缀: {len(counts)} 个")
+    finally:
+        read_cursor.close()
+        read_conn.close()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def lookup_suggestions(db_config: dict, field: str, prefix: str,
+                       limit: int = MAX_SUGGESTIONS) -> List[Dict[str, Any]]:
+    """返回以prefix开头（忽略大小写）、按热度排序的候选词"""
+    if field not in SUGGEST_FIELDS:
+        raise ValueError(f"不支持的联想字段: {field}")
+    prefix = prefix.strip()
+    key = prefix.casefold()
+    if not key:
+        return []
+    limit = max(1, min(limit, MAX_SUGGESTIONS))
+
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    try:
+        if len(key) <= PRECOMPUTED_PREFIX_LENGTH:
+            cursor.execute("""
+                SELECT term, popularity
+                FROM suggest_prefixes
+                WHERE field = %s AND prefix = %s
+                ORDER BY rank_no
+                LIMIT %s
+            """, (field, key, limit))
+        else:
+            cursor.execute("""
+                SELECT term, popularity
+                FROM suggest_terms
+                WHERE field = %s AND term LIKE %s
+                ORDER BY popularity DESC
+                LIMIT %s
+            """, (field, _escape_like(prefix) + '%', limit))
+        return [{'term': term, 'count': popularity} for term, popularity in cursor.fetchall()]
+    except Error as e:
+        if e.errno == ER_NO_SUCH_TABLE:
+            # 尚未导入数据、还没有联想词条
+            return []
+        raise
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""ConcurrencyGovernor 爬山调整的单元测试（不需要数据库）"""
+
+import math
+import unittest
+
+from ingest import (
+    ConcurrencyGovernor, MAX_COMMIT_LATENCY, MAX_BATCH_SIZE, MIN_BATCH_SIZE, MIN_WRITERS
+)
+
+
+def peaked_throughput(writers: int, batch_size: int, peak_writers: int = 2, peak_batch: int = 5000) -> float:
+    """在(peak_writers, peak_batch)处吞吐量最高，远离该点时下降（模拟锁竞争）"""
+    return 10000 - 1500 * abs(writers - peak_writers) - 1000 * abs(math.log2(batch_size / peak_batch))
+
+
+def simulate(governor: ConcurrencyGovernor, throughput, windows: int, latency: float = 0.5) -> list:
+    """逐周期把当前设置下的吞吐量交给调节器，返回每个周期的设置"""
+    history = []
+    for _ in range(windows):
+        history.append((governor.active_writers, governor.batch_size))
+        governor._adjust(throughput(governor.active_writers, governor.batch_size), latency)
+    return history
+
+
+class ConcurrencyGovernorTest(unittest.TestCase):
+
+    def test_converges_to_peak_below_starting_point(self):
+        governor = ConcurrencyGovernor(max_writers=8, initial_writers=4, batch_size=5000)
+        history = simulate(governor, peaked_throughput, 60)
+
+        # 后半段只在峰值及其相邻的设置之间试探
+        for writers, batch_size in history[30:]:
+            self.assertLessEqual(abs(writers - 2), 1)
+            self.assertIn(batch_size, (2500, 5000, 10000))
+        self.assertEqual(history[30:].count((2, 5000)), max(map(history[30:].count, set(history[30:]))))
+
+    def test_flat_throughput_does_not_drift_to_limits(self):
+        governor = ConcurrencyGovernor(max_writers=8, initial_writers=4, batch_size=5000)
+        history = simulate(governor, lambda writers, batch_size: 10000, 60)
+
+        for writers, batch_size in history:
+            self.assertLessEqual(abs(writers - 4), 1)
+            self.assertIn(batch_size, (2500, 5000, 10000))
+
+    def test_keeps_climbing_while_throughput_improves(self):
+        governor = ConcurrencyGovernor(max_writers=8, initial_writers=2, batch_size=5000)
+        simulate(governor, lambda writers, batch_size: 1000 * writers, 20)
+
+        self.assertGreaterEqual(governor.active_writers, 7)
+
+    def test_tries_both_directions_for_each_knob(self):
+        governor = ConcurrencyGovernor(max_writers=8, initial_writers=4, batch_size=5000)
+        history = simulate(governor, peaked_throughput, 12)
+
+        writers_seen = {writers for writers, _ in history}
+        batch_seen = {batch_size for _, batch_size in history}
+        self.assertTrue(any(w > 4 for w in writers_seen) and any(w < 4 for w in writers_seen))
+        self.assertTrue(any(b > 5000 for b in batch_seen) and any(b < 5000 for b in batch_seen))
+
+    def test_drop_reverts_to_exact_previous_setting(self):
+        governor = ConcurrencyGovernor(max_writers=8, initial_writers=4, batch_size=40000)
+        governor._knob = 'batch_size'
+        governor._adjust(10000, 0.5)    # 基准，批量试探增大到上限
+        self.assertEqual(governor.batch_size, MAX_BATCH_SIZE)
+        governor._adjust(5000, 0.5)     # 吞吐下降，撤销
+        self.assertEqual(governor.batch_size, 40000)
+        self.assertEqual(governor._directions['batch_size'], -1)
+
+    def test_high_latency_shrinks_batch_then_writers(self):
+        governor = ConcurrencyGovernor(max_writers=8, initial_writers=4, batch_size=2000)
+        governor._adjust(10000, MAX_COMMIT_LATENCY + 1)
+        self.assertEqual((governor.active_writers, governor.batch_size), (4, MIN_BATCH_SIZE))
+        governor._adjust(10000, MAX_COMMIT_LATENCY + 1)
+        self.assertEqual((governor.active_writers, governor.batch_size), (3, MIN_BATCH_SIZE))
+
+    def test_stays_within_bounds(self):
+        governor = ConcurrencyGovernor(max_writers=3, initial_writers=3, batch_size=MAX_BATCH_SIZE)
+        history = simulate(governor, lambda writers, batch_size: writers * batch_size, 40)
+
+        for writers, batch_size in history:
+            self.assertTrue(MIN_WRITERS <= writers <= 3)
+            self.assertTrue(MIN_BATCH_SIZE <= batch_size <= MAX_BATCH_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
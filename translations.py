@@ -14,7 +14,10 @@ TRANSLATIONS = {
         'results_count': '找到 {} 条结果',
         'loading': '加载中...',
         'error': '错误',
-        'success': '成功'
+        'success': '成功',
+        'export_csv': '导出CSV',
+        'export_xlsx': '导出Excel',
+        'query_too_broad': '查询条件过于宽泛，请添加更多条件后重试'
     },
     'en': {
         'title': 'Title',
@@ -31,6 +34,9 @@ TRANSLATIONS = {
         'results_count': 'Found {} results',
         'loading': 'Loading...',
         'error': 'Error',
-        'success': 'Success'
+        'success': 'Success',
+        'export_csv': 'Export CSV',
+        'export_xlsx': 'Export Excel',
+        'query_too_broad': 'Query too broad, please add more criteria and try again'
     }
 }